@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+'''
+Feed adversarial and randomly mutated alfred data to map-backend.py and
+check that parsing stays within time and memory limits and that offending
+nodes are quarantined.
+
+Typical call::
+
+    ./fuzz.py --mutations 5000
+
+Exits with a non-zero status if a check fails.
+
+License: CC0 1.0
+'''
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import tempfile
+import tracemalloc
+
+from generate_mesh import Mesh, format_line, random_mac
+from run import load_backend
+
+
+def adversarial(rng):
+    r'''
+    Yield ``(name, mac, line, quarantined)`` for inputs a broken or malicious
+    node might send. ``quarantined`` tells if the node must end up in
+    quarantine (otherwise it must merely be rejected or accepted cheaply).
+    '''
+    mac = random_mac(rng)
+    smac = random_mac(rng, 0x06)
+
+    def link(i, distinct = False):
+        return { 'smac': random_mac(rng, 0x06) if distinct else smac, 'dmac': '06:00:00:00:{:02x}:{:02x}'.format(i >> 8 & 255, i & 255), 'qual': 1 }
+
+    data = json.dumps({ 'links': [link(i) for i in range(100000)] }).encode('utf-8')
+    yield 'link flood (plain)', mac, format_line(mac, data), True
+
+    mac = random_mac(rng)
+    yield 'link flood (gzip)', mac, format_line(mac, gzip.compress(data, mtime=0)), True
+
+    mac = random_mac(rng)
+    data = json.dumps({ 'links': [link(i) for i in range(1001)] }).encode('utf-8')
+    yield 'too many links', mac, format_line(mac, gzip.compress(data, mtime=0)), True
+
+    mac = random_mac(rng)
+    data = json.dumps({ 'links': [link(i, True) for i in range(500)] }).encode('utf-8')
+    yield 'too many interfaces', mac, format_line(mac, gzip.compress(data, mtime=0)), True
+
+    mac = random_mac(rng)
+    data = b'{"name": "' + b' ' * (100 * 1024 * 1024) + b'"}'
+    yield 'zip bomb', mac, format_line(mac, gzip.compress(data, mtime=0)), True
+
+    mac = random_mac(rng)
+    yield 'deep nesting', mac, format_line(mac, b'[' * 60000), False
+
+    mac = random_mac(rng)
+    yield 'long strings', mac, format_line(mac, json.dumps({ 'name': 'x' * 60000 }).encode('utf-8')), False
+
+    mac = random_mac(rng)
+    data = json.dumps({ 'addresses': ['fdef::1'] * 6000 }).encode('utf-8')
+    yield 'many addresses', mac, format_line(mac, gzip.compress(data, mtime=0)), False
+
+def mutate(rng, line):
+    r'''
+    Return ``line`` with some random bytes flipped, removed or duplicated.
+    '''
+    line = bytearray(line.encode('latin-1'))
+    for i in range(rng.randint(1, 8)):
+        position = rng.randrange(len(line))
+        kind = rng.randrange(3)
+        if kind == 0:
+            line[position] = rng.randrange(32, 127)
+        elif kind == 1:
+            del line[position]
+        else:
+            line[position:position] = line[position:position + rng.randint(1, 64)]
+    return line.decode('latin-1')
+
+def parse(backend, lines, budget, nodes = None):
+    nodes = {} if nodes is None else nodes
+    links = {}
+    with tempfile.NamedTemporaryFile('w', suffix='.txt') as maps:
+        for line in lines:
+            maps.write(line + '\n')
+        maps.flush()
+
+        stderr = sys.stderr
+        sys.stderr = open(os.devnull, 'w')
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            backend.parser.parseMaps(maps.name, nodes, links, budget)
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            sys.stderr.close()
+            sys.stderr = stderr
+
+    return nodes, links, seconds, peak
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fuzz the alfred parser of map-backend.py')
+    parser.add_argument('--mutations', type=int, default=2000, help=r'number of randomly mutated lines')
+    parser.add_argument('--seed', type=int, default=0, help=r'seed of the random generator')
+    parser.add_argument('--max-seconds', type=float, default=10.0, help=r'time limit for each batch of lines')
+    parser.add_argument('--max-memory', type=int, default=64, help=r'peak memory limit (MiB) for each batch of lines')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    backend = load_backend()
+    failures = []
+
+    def check(name, seconds, peak):
+        ok = seconds <= args.max_seconds and peak <= args.max_memory * 1024 * 1024
+        print('{:<4} {:<28} {:>9.1f} ms {:>8.1f} MiB'.format('ok' if ok else 'FAIL', name, seconds * 1000, peak / 1024 / 1024))
+        if not ok:
+            failures.append(name)
+
+    # each adversarial input on its own
+    for name, mac, line, quarantined in adversarial(rng):
+        budget = backend.parser.Budget()
+        nodes, links, seconds, peak = parse(backend, [line], budget)
+        check(name, seconds, peak)
+        if mac in nodes:
+            failures.append(name)
+            print('     node was accepted')
+        if quarantined and mac not in budget.quarantine:
+            failures.append(name)
+            print('     node was not quarantined')
+
+    # a mesh exceeding the global link budget
+    mesh = Mesh(500, seed = args.seed)
+    budget = backend.parser.Budget(max_total_links = 300)
+    nodes, links, seconds, peak = parse(backend, list(mesh.lines(malformed = 0)), budget)
+    check('global link budget', seconds, peak)
+    if len(links) > 300 or not budget.quarantine:
+        failures.append('global link budget')
+        print('     {} links accepted, {} nodes quarantined'.format(len(links), len(budget.quarantine)))
+
+    # a node reporting new interface MACs in every run
+    budget = backend.parser.Budget()
+    mac = random_mac(rng)
+    nodes = {}
+    sizes = []
+    seconds = peak = 0
+    for run in range(5):
+        node_links = [{ 'smac': random_mac(rng, 0x06), 'dmac': random_mac(rng, 0x06), 'qual': 1 } for i in range(budget.max_interfaces - 4)]
+        line = format_line(mac, json.dumps({ 'links': node_links }).encode('utf-8'))
+        nodes, links, run_seconds, run_peak = parse(backend, [line], budget, nodes)
+        seconds += run_seconds
+        peak = max(peak, run_peak)
+        sizes.append(len(nodes))
+    check('changing interface MACs', seconds, peak)
+    if max(sizes) > budget.max_interfaces + 1:
+        failures.append('changing interface MACs')
+        print('     node set grew to {} entries'.format(', '.join(str(size) for size in sizes)))
+
+    # random mutations of valid lines
+    mesh = Mesh(200, seed = args.seed)
+    valid = list(mesh.lines(malformed = 0))
+    lines = [mutate(rng, rng.choice(valid)) for i in range(args.mutations)]
+    nodes, links, seconds, peak = parse(backend, lines, backend.parser.Budget())
+    check('{} mutated lines'.format(args.mutations), seconds, peak)
+
+    if failures:
+        print('Failed: {}'.format(', '.join(failures)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
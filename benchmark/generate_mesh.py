@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+'''
+Generate a synthetic mesh in the format returned by alfred (``alfred -r 64``)
+for testing and benchmarking map-backend.py
+
+Typical call::
+
+    ./generate_mesh.py --nodes 10000 -o maps.txt --aliases aliases.json
+    ../freifunk/map-backend.py -m maps.txt -a aliases.json --meshviewer-org meshviewer.json
+
+License: CC0 1.0
+'''
+
+import sys
+import json
+import gzip
+import random
+
+
+COMMUNITIES = ['bielefeld', 'guetersloh', 'herford', 'lemgo', 'obernkirchen']
+MODELS = ['TP-Link TL-WR841N/ND v9', 'TP-Link TL-WR1043N/ND v2', 'GL.iNet GL-AR150', 'Ubiquiti UniFi AC Mesh', 'Netgear WNDR3700 v2']
+FIRMWARES = ['ffbi-0.4.2', 'ffbi-0.4.3', 'ffbi-0.5.0', 'ffbi-0.5.1', 'server']
+BRANCHES = ['stable', 'testing', '']
+
+# the center of the map, nodes are placed in clusters around it
+CENTER = (52.0211, 8.5347)
+
+
+def random_mac(rng, prefix = 0x02):
+    return ':'.join(['{:02x}'.format(prefix)] + ['{:02x}'.format(rng.randrange(256)) for i in range(5)])
+
+def escape(data):
+    r'''
+    Escape ``data`` like alfred does: printable characters are kept, all
+    others (and quotes and backslashes) are written as ``\xNN``.
+    '''
+    return ''.join(chr(c) if 32 <= c < 127 and c not in (34, 92) else '\\x{:02x}'.format(c) for c in data)
+
+def format_line(mac, data):
+    return '{{ "{0}", "{1}" }},'.format(mac, escape(data))
+
+class Mesh:
+    r'''
+    A random mesh of ``count`` nodes.
+
+    Each node has one to three mesh interfaces. The number of neighbours of
+    a node is drawn from a geometric distribution with mean ``degree``
+    (capped at ``max_degree``); neighbours are chosen close by, so that
+    nodes form clusters. Links are reported by both ends, except for a
+    fraction of ``missing_reverse`` links which are only reported by one.
+    '''
+    def __init__(self, count, degree = 3.0, max_degree = 30, missing_reverse = 0.05, seed = 0):
+        self.rng = rng = random.Random(seed)
+        self.macs = [random_mac(rng) for i in range(count)]
+        self.interfaces = [[random_mac(rng, 0x06) for j in range(rng.choice([1, 1, 2, 3]))] for i in range(count)]
+
+        # nodes are placed on clusters of about 50 nodes, node i belongs to cluster i // 50
+        clusters = [(CENTER[0] + rng.gauss(0, 0.3), CENTER[1] + rng.gauss(0, 0.5)) for i in range(count // 50 + 1)]
+        self.positions = []
+        for i in range(count):
+            latitude, longitude = clusters[i // 50]
+            self.positions.append((latitude + rng.gauss(0, 0.01), longitude + rng.gauss(0, 0.01)))
+
+        # node index => list of (own interface, neighbour interface, quality)
+        self.links = [[] for i in range(count)]
+        p = 1.0 / (1.0 + degree)
+        for i in range(count):
+            wanted = 0
+            while rng.random() > p and wanted < max_degree:
+                wanted += 1
+            for k in range(wanted // 2 + wanted % 2):
+                j = min(count - 1, max(0, i + int(rng.gauss(0, 25))))
+                if j == i:
+                    continue
+                smac = rng.choice(self.interfaces[i])
+                dmac = rng.choice(self.interfaces[j])
+                self.links[i].append((smac, dmac, float(rng.randint(1, 255))))
+                if rng.random() >= missing_reverse:
+                    self.links[j].append((dmac, smac, float(rng.randint(1, 255))))
+
+    def properties(self, i, geo = 'latlon'):
+        r'''
+        Return the properties node ``i`` would announce. ``geo`` selects how
+        its position is reported: ``latlon`` (``latitude``/``longitude``),
+        ``geo`` (the deprecated string) or ``none``.
+        '''
+        rng = self.rng
+        properties = {
+            'name': 'node-{}'.format(i),
+            'firmware': rng.choice(FIRMWARES),
+            'community': rng.choice(COMMUNITIES),
+            'model': rng.choice(MODELS),
+            'autoupdater': rng.choice(BRANCHES),
+            'uptime': rng.randint(60, 90 * 24 * 3600),
+            'loadavg': round(rng.random() * 2, 2),
+            'rootfs_usage': round(rng.random(), 4),
+            'memory_usage': round(rng.random(), 4),
+            'addresses': ['fdef:17a0:ffb1:300:{:x}::1'.format(i), 'fe80::{:x}:1'.format(i)],
+            'clientcount': rng.randint(0, 30),
+            'links': [{ 'smac': smac, 'dmac': dmac, 'qual': quality } for smac, dmac, quality in self.links[i]]
+        }
+
+        if rng.random() < 0.5:
+            properties['contact'] = 'owner{}@example.org'.format(i)
+
+        if i % 200 == 0:
+            properties['gateway'] = True
+            properties['vpn'] = True
+
+        latitude, longitude = self.positions[i]
+        if geo == 'latlon':
+            properties['latitude'] = latitude
+            properties['longitude'] = longitude
+        elif geo == 'geo':
+            properties['geo'] = '{:.8f} {:.8f}'.format(latitude, longitude)
+
+        return properties
+
+    def malformed(self, i):
+        r'''
+        Return a line for node ``i`` which ``parse_line`` must reject.
+        '''
+        rng = self.rng
+        mac = self.macs[i]
+        kind = rng.randrange(5)
+        if kind == 0:
+            # broken framing
+            return '{{ "{0}", "{{}}"'.format(mac)
+        if kind == 1:
+            # invalid MAC
+            return format_line(mac.upper().replace(':', '-'), b'{}')
+        if kind == 2:
+            # invalid JSON
+            return format_line(mac, b'{"name": "node')
+        if kind == 3:
+            # violates ALFRED_NODE_SCHEMA
+            return format_line(mac, json.dumps({ 'name': 'x' * 100, 'unknown': 1 }).encode('utf-8'))
+        # truncated gzip data
+        return format_line(mac, gzip.compress(json.dumps(self.properties(i)).encode('utf-8'), mtime=0)[:20])
+
+    def lines(self, compressed = 0.8, geo = 0.1, no_position = 0.1, malformed = 0.01):
+        r'''
+        Yield the lines of an alfred dump of this mesh.
+
+        ``compressed`` is the fraction of nodes sending gzip compressed
+        data, ``geo`` the fraction using the deprecated ``geo`` string,
+        ``no_position`` the fraction without any position and ``malformed``
+        the fraction of broken lines.
+        '''
+        rng = self.rng
+        for i, mac in enumerate(self.macs):
+            if rng.random() < malformed:
+                yield self.malformed(i)
+                continue
+
+            r = rng.random()
+            variant = 'geo' if r < geo else ('none' if r < geo + no_position else 'latlon')
+            data = json.dumps(self.properties(i, variant)).encode('utf-8')
+            if rng.random() < compressed:
+                data = gzip.compress(data, mtime=0)
+            yield format_line(mac, data)
+
+    def aliases(self, fraction = 0.01):
+        r'''
+        Return aliases (as in ``aliases.json``) for a fraction of the nodes.
+        '''
+        rng = self.rng
+        aliases = {}
+        for i, mac in enumerate(self.macs):
+            if rng.random() >= fraction:
+                continue
+            latitude, longitude = self.positions[i]
+            alias = { 'name': 'alias-{}'.format(i), 'latitude': latitude, 'longitude': longitude }
+            if rng.random() < 0.5:
+                alias['force'] = True
+            aliases[mac] = alias
+        return aliases
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate a synthetic alfred dump for map-backend.py')
+    parser.add_argument('-n', '--nodes', type=int, default=1000, help=r'number of nodes')
+    parser.add_argument('-o', '--output', help=r'output file (default: stdout)')
+    parser.add_argument('--aliases', help=r'also write an aliases.json for some of the nodes')
+    parser.add_argument('--seed', type=int, default=0, help=r'seed of the random generator')
+    parser.add_argument('--degree', type=float, default=3.0, help=r'mean number of links per node')
+    parser.add_argument('--max-degree', type=int, default=30, help=r'maximum number of links per node')
+    parser.add_argument('--missing-reverse', type=float, default=0.05, help=r'fraction of links only reported by one end')
+    parser.add_argument('--compressed', type=float, default=0.8, help=r'fraction of nodes sending gzip compressed data')
+    parser.add_argument('--geo', type=float, default=0.1, help=r'fraction of nodes using the deprecated geo field')
+    parser.add_argument('--no-position', type=float, default=0.1, help=r'fraction of nodes without a position')
+    parser.add_argument('--malformed', type=float, default=0.01, help=r'fraction of malformed lines')
+    args = parser.parse_args()
+
+    mesh = Mesh(args.nodes, args.degree, args.max_degree, args.missing_reverse, args.seed)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for line in mesh.lines(args.compressed, args.geo, args.no_position, args.malformed):
+            output.write(line + '\n')
+    finally:
+        if args.output:
+            output.close()
+
+    if args.aliases:
+        with open(args.aliases, 'w') as file:
+            json.dump(mesh.aliases(), file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+'''
+Load test the HTTP query server of map-backend.py (``--serve``): many
+concurrent keep-alive clients send a mix of node, name, bounding box,
+neighbour and community queries and the throughput and latency
+percentiles are reported.
+
+Typical call::
+
+    ./query_load.py --nodes 50000 --clients 50 --requests 200
+
+The server runs in a child process on the nodes of a synthetic mesh (see
+generate_mesh.py and readers.py), so it does not compete with the clients
+for the interpreter.
+
+License: CC0 1.0
+'''
+
+import sys
+import time
+import random
+import asyncio
+import multiprocessing
+
+from generate_mesh import Mesh
+from run import load_backend
+from readers import build
+
+
+def serve(size, seed, port, ready):
+    r'''
+    Answer queries about a mesh of ``size`` nodes on ``port`` until killed.
+    '''
+    backend = load_backend()
+    import mapbackend.query
+
+    nodes, links = build(backend, Mesh(size, seed = seed))
+    server = mapbackend.query.QueryServer(backend.serializer.JsonSerializer())
+    server.index = mapbackend.query.QueryIndex(nodes, links)
+
+    async def run():
+        await server.start('127.0.0.1', port)
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+def targets(mesh, count, rng):
+    r'''
+    Return ``count`` request targets: mostly single nodes, the rest name
+    prefixes, small bounding boxes, neighbourhoods and communities.
+    '''
+    result = []
+    for i in range(count):
+        choice = rng.random()
+        node = rng.randrange(len(mesh.macs))
+        mac = mesh.macs[node]
+        if choice < 0.6:
+            result.append('/api/nodes/{}'.format(mac.replace(':', '')))
+        elif choice < 0.75:
+            result.append('/api/nodes?name=node-{}&limit=20'.format(str(node)[:3]))
+        elif choice < 0.85:
+            latitude, longitude = mesh.positions[node]
+            result.append('/api/nodes?bbox={:.3f},{:.3f},{:.3f},{:.3f}&limit=100'.format(latitude - 0.01, longitude - 0.01, latitude + 0.01, longitude + 0.01))
+        elif choice < 0.95:
+            result.append('/api/nodes/{}/neighbours'.format(mac))
+        else:
+            result.append('/api/communities')
+    return result
+
+async def client(port, targets, latencies):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for target in targets:
+            start = time.perf_counter()
+            writer.write('GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(target).encode('latin-1'))
+            await writer.drain()
+
+            length = 0
+            while True:
+                header = await reader.readline()
+                if header in (b'\r\n', b''):
+                    break
+                name, _, value = header.partition(b':')
+                if name.strip().lower() == b'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Load test the query server of map-backend.py')
+    parser.add_argument('-n', '--nodes', type=int, default=50000, help=r'number of nodes')
+    parser.add_argument('-c', '--clients', type=int, default=50, help=r'number of concurrent connections')
+    parser.add_argument('-r', '--requests', type=int, default=200, help=r'requests per connection')
+    parser.add_argument('--port', type=int, default=18765, help=r'port of the server')
+    parser.add_argument('--seed', type=int, default=0, help=r'seed of the mesh generator and the queries')
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target = serve, args = (args.nodes, args.seed, args.port, ready), daemon = True)
+    server.start()
+    if not ready.wait(600):
+        sys.stderr.write('the server did not start\n')
+        return 1
+
+    rng = random.Random(args.seed)
+    mesh = Mesh(args.nodes, seed = args.seed)
+    work = [targets(mesh, args.requests, rng) for i in range(args.clients)]
+
+    async def run():
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*[client(args.port, targets, latencies) for targets in work])
+        return latencies, time.perf_counter() - start
+
+    try:
+        latencies, seconds = asyncio.run(run())
+    finally:
+        server.terminate()
+
+    latencies.sort()
+    print('{} nodes, {} clients: {} requests in {:.2f} s, {:.0f} requests/s'.format(
+        args.nodes, args.clients, len(latencies), seconds, len(latencies) / seconds))
+    print('  latency p50 {:.2f} ms, p90 {:.2f} ms, p99 {:.2f} ms, max {:.2f} ms'.format(
+        percentile(latencies, 0.5) * 1000, percentile(latencies, 0.9) * 1000,
+        percentile(latencies, 0.99) * 1000, latencies[-1] * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+'''
+Compare the latency of local readers of the map data: parsing meshviewer.json
+against opening the binary snapshot (see ../freifunk/snapshot.py) and
+querying it.
+
+Typical call::
+
+    ./readers.py --nodes 50000
+
+The nodes are built directly from a synthetic mesh (see generate_mesh.py),
+skipping the alfred parser, so large meshes are quick to set up.
+
+License: CC0 1.0
+'''
+
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+
+from generate_mesh import Mesh
+from run import load_backend
+
+
+def build(backend, mesh):
+    r'''
+    Return the ``nodes`` and ``links`` map-backend.py would have after
+    parsing the alfred data of ``mesh``.
+    '''
+    nodes = {}
+    links = {}
+    for i, mac in enumerate(mesh.macs):
+        properties = mesh.properties(i)
+        properties.setdefault('gateway', False)
+        properties.setdefault('vpn', False)
+        node_links = properties.pop('links')
+        node = nodes[mac] = backend.core.Node(mac, properties, True)
+        for link in node_links:
+            nodes[link['smac']] = node
+            links[(link['smac'], link['dmac'])] = backend.core.Link(node, link['smac'], link['dmac'], link['qual'])
+    backend.parser.linkReverse(links)
+    return nodes, links
+
+def timed(function, repeat):
+    r'''
+    Return the median time of ``repeat`` calls of ``function`` in seconds.
+    '''
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare reading meshviewer.json with reading the binary snapshot')
+    parser.add_argument('-n', '--nodes', type=int, default=50000, help=r'number of nodes')
+    parser.add_argument('--repeat', type=int, default=10, help=r'number of runs of each reader')
+    parser.add_argument('--seed', type=int, default=0, help=r'seed of the mesh generator')
+    args = parser.parse_args()
+
+    backend = load_backend()
+    import snapshot
+
+    nodes, links = build(backend, Mesh(args.nodes, seed = args.seed))
+    some_mac = sorted(nodes)[len(nodes) // 2]
+    community = 'bielefeld'
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'meshviewer.json')
+        snapshot_path = os.path.join(directory, 'nodes.snapshot')
+
+        with open(json_path, 'wb') as file:
+            backend.serializer.JsonSerializer(backend = 'json').dump(backend.meshviewer.render_meshviewer_org(nodes, links), file)
+        write_seconds = timed(lambda: snapshot.write(snapshot_path, backend.core.now_timestamp, backend.binary.render_snapshot(nodes, links)), 1)
+
+        def json_totals(loads):
+            with open(json_path, 'rb') as file:
+                decoded = loads(file.read())
+            totals = [0, 0, 0]
+            for element in decoded['nodes']:
+                if element['is_online'] and element['site_code'] == community:
+                    totals[0] += 1
+                    totals[1] += element['clients']
+                    totals[2] += element['is_gateway']
+            return totals
+
+        def json_find(loads):
+            with open(json_path, 'rb') as file:
+                decoded = loads(file.read())
+            for element in decoded['nodes']:
+                if element['mac'] == some_mac:
+                    return element
+
+        def snapshot_totals():
+            with snapshot.Snapshot(snapshot_path) as nodes:
+                return nodes.totals(community)
+
+        def snapshot_find():
+            with snapshot.Snapshot(snapshot_path) as nodes:
+                return nodes.find(some_mac)
+
+        def snapshot_scan():
+            with snapshot.Snapshot(snapshot_path) as nodes:
+                return sum(node.clients for node in nodes if node.online and node.community == community)
+
+        readers = [
+            ('json totals', lambda: json_totals(json.loads)),
+            ('json find', lambda: json_find(json.loads)),
+        ]
+        try:
+            import orjson
+            readers += [
+                ('orjson totals', lambda: json_totals(orjson.loads)),
+                ('orjson find', lambda: json_find(orjson.loads)),
+            ]
+        except ImportError:
+            pass
+        readers += [
+            ('snapshot totals', snapshot_totals),
+            ('snapshot find', snapshot_find),
+            ('snapshot full scan', snapshot_scan),
+        ]
+
+        print('{} nodes, meshviewer.json {:.1f} MiB, snapshot {:.1f} MiB (written in {:.1f} ms)'.format(len(set(nodes.values())),
+            os.path.getsize(json_path) / 1024 / 1024, os.path.getsize(snapshot_path) / 1024 / 1024, write_seconds * 1000))
+        for name, reader in readers:
+            print('  {:<20} {:>10.3f} ms'.format(name, timed(reader, args.repeat) * 1000))
+
+
+if __name__ == '__main__':
+    main()
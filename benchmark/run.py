@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+'''
+Time and memory-profile each stage of map-backend.py on synthetic meshes
+(see generate_mesh.py) and store the results for comparison between commits.
+
+Typical call::
+
+    ./run.py --sizes 1000 10000
+    ./run.py --sizes 1000 10000 --compare <older commit>
+
+Results are stored as results/<commit>.json.
+
+License: CC0 1.0
+'''
+
+import os
+import sys
+import json
+import time
+import tempfile
+import tracemalloc
+import subprocess
+
+from generate_mesh import Mesh
+
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIR = os.path.dirname(BENCHMARK_DIR)
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+def load_backend():
+    r'''
+    Import the mapbackend package next to map-backend.py with all modules
+    the stages use and set the time of the run.
+    '''
+    # like when map-backend.py is run as a script
+    sys.path.insert(0, os.path.join(REPOSITORY_DIR, 'freifunk'))
+    import mapbackend.core, mapbackend.parser, mapbackend.storage, mapbackend.serializer
+    import mapbackend.meshviewer, mapbackend.ffmap, mapbackend.nodelist, mapbackend.stats, mapbackend.binary
+    mapbackend.core.updateTimestamp()
+    return mapbackend
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPOSITORY_DIR, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def stages(backend, directory):
+    r'''
+    Return the stages of a run of map-backend as a list of ``(name,
+    function)``. The functions share their state and must be called in
+    order.
+    '''
+    state = {}
+    maps = os.path.join(directory, 'maps.txt')
+    aliases = os.path.join(directory, 'aliases.json')
+    storage = os.path.join(directory, 'nodes_backup.bin')
+    serializer = backend.serializer.JsonSerializer()
+
+    def parse():
+        state['nodes'] = {}
+        state['links'] = {}
+        # malformed lines are reported on stderr
+        stderr = sys.stderr
+        sys.stderr = open(os.devnull, 'w')
+        try:
+            backend.parser.parseMaps(maps, state['nodes'], state['links'])
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+
+    def alias_merge():
+        backend.parser.applyAliases(state['nodes'], backend.parser.loadAliases(aliases))
+
+    def reverse_linking():
+        backend.parser.linkReverse(state['links'])
+
+    def renderer(render):
+        return lambda: serializer.dumps(render(state['nodes'], state['links']))
+
+    def storage_save():
+        backend.storage.saveNodes(storage, state['nodes'])
+
+    def storage_load():
+        backend.storage.loadNodes(storage)
+
+    return [
+        ('parse', parse),
+        ('alias merge', alias_merge),
+        ('reverse linking', reverse_linking),
+        ('render meshviewer-org', renderer(backend.meshviewer.render_meshviewer_org)),
+        ('render meshviewer-nodes', renderer(backend.meshviewer.render_meshviewer_nodes_old)),
+        ('render meshviewer-graph', renderer(backend.meshviewer.render_meshviewer_graph_old)),
+        ('render ffmap-nodes', renderer(backend.ffmap.render_ffmap)),
+        ('render nodelist', renderer(backend.nodelist.render_nodelist)),
+        ('render stats', renderer(backend.stats.render_stats)),
+        ('storage save', storage_save),
+        ('storage load', storage_load),
+    ]
+
+def measure(backend, directory, memory):
+    r'''
+    Run all stages and return a dictionary stage => { seconds, peak_bytes }.
+    Memory is measured in a second pass since tracemalloc distorts timings.
+    '''
+    result = {}
+    for name, function in stages(backend, directory):
+        start = time.perf_counter()
+        function()
+        result[name] = { 'seconds': time.perf_counter() - start }
+
+    if memory:
+        for name, function in stages(backend, directory):
+            tracemalloc.start()
+            function()
+            result[name]['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return result
+
+def run(sizes, memory, seed):
+    backend = load_backend()
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            mesh = Mesh(size, seed = seed)
+            with open(os.path.join(directory, 'maps.txt'), 'w') as file:
+                for line in mesh.lines():
+                    file.write(line + '\n')
+            with open(os.path.join(directory, 'aliases.json'), 'w') as file:
+                json.dump(mesh.aliases(), file)
+
+            results[str(size)] = measure(backend, directory, memory)
+            print_results(size, results[str(size)])
+    return results
+
+def print_results(size, result, reference = None):
+    print('{} nodes:'.format(size))
+    for name, values in result.items():
+        line = '  {:<26} {:>10.1f} ms'.format(name, values['seconds'] * 1000)
+        if 'peak_bytes' in values:
+            line += ' {:>10.1f} MiB'.format(values['peak_bytes'] / 1024 / 1024)
+        if reference and name in reference:
+            line += '   x{:.2f} time'.format(values['seconds'] / reference[name]['seconds'])
+        print(line)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the stages of map-backend.py on synthetic meshes')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000, 100000], help=r'numbers of nodes to benchmark')
+    parser.add_argument('--no-memory', help=r'skip the memory profiling pass', action='store_true')
+    parser.add_argument('--seed', type=int, default=0, help=r'seed of the mesh generator')
+    parser.add_argument('--compare', metavar='COMMIT', help=r'compare with the stored results of another commit')
+    parser.add_argument('-o', '--output', help=r'where to store the results (default: results/<commit>.json)')
+    args = parser.parse_args()
+
+    results = {
+        'commit': commit(),
+        'python': sys.version.split()[0],
+        'sizes': run(args.sizes, not args.no_memory, args.seed)
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, '{}.json'.format(results['commit']))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print('Results stored in {}'.format(output))
+
+    if args.compare:
+        with open(os.path.join(RESULTS_DIR, '{}.json'.format(args.compare)), 'r') as file:
+            reference = json.load(file)
+        print('Compared to {}:'.format(args.compare))
+        for size, result in results['sizes'].items():
+            print_results(size, result, reference['sizes'].get(size, None))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+'''
+Compare the JSON backends of map-backend.py (see JsonSerializer in
+../freifunk/mapbackend/serializer.py): time each installed backend on the
+meshviewer.json of synthetic meshes and verify that its compact output is
+byte for byte the one of the json module (and its pretty output
+equivalent).
+
+Typical call::
+
+    ./serializers.py --sizes 2000 20000
+
+License: CC0 1.0
+'''
+
+import sys
+import json
+import time
+import importlib
+
+from generate_mesh import Mesh
+from run import load_backend
+from readers import build
+
+
+# floats the backends write differently, see JsonSerializer
+SPECIAL_FLOATS = [6.8e-05, -6.8e-05, 1e-07, 1.5e-10, 1e+16, -2.5e+20, 1.2345678901234568e+17, 5e-324, 0.0001, 1e15]
+
+def backends(serializer):
+    result = []
+    for name in serializer.JsonSerializer.BACKENDS:
+        try:
+            importlib.import_module(name)
+            result.append(name)
+        except ImportError:
+            continue
+    return result
+
+def timed(function, repeat):
+    r'''
+    Return the result of ``function`` and the mean time of ``repeat``
+    calls in seconds.
+    '''
+    start = time.perf_counter()
+    for i in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+def verify(serializer, names):
+    r'''
+    Return the backends whose compact output of some special floats and
+    strings differs from the json module.
+    '''
+    obj = {
+        'floats': SPECIAL_FLOATS,
+        'nested': [{ 'loadavg': value, 'name': 'node {}'.format(i) } for i, value in enumerate(SPECIAL_FLOATS)],
+        'strings': ['Bielefeld Süd', 'Gästehaus   "quoted" \\ back\\slash', '\x00\x1f\x7f', '😀', 'fdef::9e3:1', '10.00001'],
+        'big': 2 ** 70
+    }
+    reference = serializer.JsonSerializer(backend = 'json').dumps(obj)
+    return [name for name in names if serializer.JsonSerializer(backend = name).dumps(obj) != reference]
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare the JSON backends of map-backend.py')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2000, 20000], help=r'numbers of nodes')
+    parser.add_argument('--repeat', type=int, default=5, help=r'number of runs of each backend')
+    parser.add_argument('--seed', type=int, default=0, help=r'seed of the mesh generator')
+    args = parser.parse_args()
+
+    backend = load_backend()
+    serializer = backend.serializer
+    names = backends(serializer)
+
+    different = verify(serializer, names)
+    print('Backends: {}, special values: {}'.format(', '.join(names), 'differ for ' + ', '.join(different) if different else 'identical'))
+
+    failed = bool(different)
+    for size in args.sizes:
+        nodes, links = build(backend, Mesh(size, seed = args.seed))
+        obj = backend.meshviewer.render_meshviewer_org(nodes, links)
+
+        results = {}
+        for pretty in (False, True):
+            for name in names:
+                dumps = serializer.JsonSerializer(pretty, name).dumps
+                results[(name, pretty)] = timed(lambda: dumps(obj), args.repeat)
+
+        reference, seconds = results[('json', False)]
+        print('{} nodes, meshviewer.json {:.1f} MiB:'.format(size, len(reference) / 1024 / 1024))
+        for pretty in (False, True):
+            baseline = results[('json', pretty)][1]
+            for name in names:
+                data, seconds = results[(name, pretty)]
+                if pretty:
+                    same = json.loads(data.decode('utf-8')) == json.loads(results[('json', True)][0].decode('utf-8'))
+                else:
+                    same = data == reference
+                failed = failed or not same
+                print('  {:<8} {:<8} {:>10.1f} ms   x{:<6.1f} {}'.format(name, 'pretty' if pretty else 'compact', seconds * 1000,
+                    baseline / seconds, ('equivalent' if pretty else 'identical') if same else 'DIFFERENT'))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
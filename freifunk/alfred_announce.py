@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+'''
+Announce the map information of this server via alfred (data type 64, in
+the format map-backend.py expects).
+
+The neighbours are read from batman-adv and the interface addresses from
+sysfs directly and the data is pushed over the alfred socket, so no other
+programs are run. Data is only pushed if it changed or the last push is
+older than the refresh interval (alfred forgets data after 10 minutes).
+
+Runs started from cron every 5 minutes would always be due for a refresh,
+so it is meant to keep running and check for changes every ``--interval``
+seconds (update.sh starts it like that)::
+
+    ./alfred_announce.py --name "$(hostname)" --community bielefeld --vpn true --gateway false --interval 60
+
+License: CC0 1.0
+'''
+
+import os
+import re
+import sys
+import json
+import zlib
+import time
+import socket
+import struct
+import hashlib
+
+
+# see packet.h of alfred
+ALFRED_PUSH_DATA = 0
+ALFRED_VERSION = 0
+ALFRED_MAX_PAYLOAD = 65535 - 18
+
+MAP_DATA_TYPE = 64
+
+NEIGHBORS = '/sys/kernel/debug/batman_adv/bat0/neighbors'
+SYSFS_NET = '/sys/class/net'
+
+
+class Announcer:
+    r'''
+    Builds the map information of this server and pushes it via alfred.
+    '''
+    def __init__(self, properties, neighbors = NEIGHBORS, sysfs = SYSFS_NET):
+        self.properties = properties
+        self.neighbors = neighbors
+        self.sysfs = sysfs
+        self.addresses = {}
+
+    def address(self, interface):
+        r'''
+        Return the MAC address of ``interface`` (cached as long as the
+        interface has neighbours, see :meth:`links`) or ``None`` if it does
+        not exist (anymore).
+        '''
+        if interface not in self.addresses:
+            try:
+                with open(os.path.join(self.sysfs, interface, 'address'), 'r') as file:
+                    self.addresses[interface] = file.read().strip()
+            except OSError:
+                return None
+        return self.addresses[interface]
+
+    def links(self):
+        r'''
+        Return the links to all batman-adv neighbours.
+        '''
+        links = []
+        try:
+            with open(self.neighbors, 'r') as file:
+                lines = file.readlines()
+        except OSError:
+            return links
+
+        interfaces = set()
+        for line in lines:
+            if not re.match('^[a-f0-9]', line):
+                continue
+            # neighbour, last seen, throughput, interface
+            fields = re.split(r'[][)( \t]+', line.strip())
+            if len(fields) < 4:
+                continue
+            interfaces.add(fields[3])
+            smac = self.address(fields[3])
+            if smac:
+                links.append({ 'smac': smac, 'dmac': fields[0], 'qual': 100.0 })
+
+        # interfaces without neighbours might be gone, e.g. a fastd interface
+        # that was created again with another MAC
+        for interface in list(self.addresses):
+            if interface not in interfaces:
+                del self.addresses[interface]
+
+        return links
+
+    def payload(self):
+        r'''
+        Return the data to announce, conforming to
+        ``AlfredParser.ALFRED_NODE_SCHEMA`` of mapbackend/parser.py.
+        '''
+        payload = dict(self.properties)
+        payload['links'] = self.links()
+        payload['clientcount'] = 0
+        return json.dumps(payload).encode('utf-8')
+
+def push(path, data_type, data):
+    r'''
+    Push ``data`` as ``data_type`` to the alfred server listening on the
+    unix socket ``path``.
+    '''
+    if len(data) > ALFRED_MAX_PAYLOAD:
+        raise ValueError("alfred data must not exceed {} bytes".format(ALFRED_MAX_PAYLOAD))
+
+    # the server replaces the (empty) source by its own MAC
+    block = bytes(6) + struct.pack('!BBH', data_type, ALFRED_VERSION, len(data)) + data
+    transaction = os.urandom(2) + struct.pack('!H', 0)
+    packet = struct.pack('!BBH', ALFRED_PUSH_DATA, ALFRED_VERSION, len(transaction) + len(block)) + transaction + block
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(packet)
+
+class State:
+    r'''
+    The digest of the data pushed last and when it was pushed, kept in a
+    file between calls.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.digest = None
+        self.pushed = 0.0
+        try:
+            with open(path, 'r') as file:
+                self.digest, pushed = file.read().split()
+                self.pushed = float(pushed)
+        except (OSError, ValueError):
+            pass
+
+    def due(self, digest, refresh):
+        return digest != self.digest or time.time() - self.pushed >= refresh
+
+    def save(self, digest):
+        self.digest = digest
+        self.pushed = time.time()
+        if self.path:
+            with open(self.path, 'w') as file:
+                file.write('{} {}\n'.format(self.digest, self.pushed))
+
+def announce(announcer, state, args):
+    r'''
+    Push the current data if it changed or is due for a refresh. Returns
+    whether data was pushed.
+    '''
+    payload = announcer.payload()
+    digest = hashlib.sha1(payload).hexdigest()
+    if not state.due(digest, args.refresh):
+        return False
+
+    # gzip format (like gzip -c), map-backend.py detects it
+    compress = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    push(args.socket, MAP_DATA_TYPE, compress.compress(payload) + compress.flush())
+    state.save(digest)
+    return True
+
+def check(payload):
+    r'''
+    Validate ``payload`` against the schema map-backend.py uses.
+    '''
+    from mapbackend.parser import AlfredParser
+
+    AlfredParser.validate(json.loads(payload.decode('utf-8')), 'ALFRED_NODE_SCHEMA')
+
+def main():
+    import argparse
+
+    boolean = { 'true': True, 'false': False }
+
+    parser = argparse.ArgumentParser(description='Announce the map information of this server via alfred')
+    parser.add_argument('--name', help=r'name of this server (cut to 31 characters)')
+    parser.add_argument('--firmware', help=r'firmware shown on the map')
+    parser.add_argument('--community', help=r'community of this server')
+    parser.add_argument('--vpn', choices=['true', 'false', ''], help=r'whether this server is a VPN server')
+    parser.add_argument('--gateway', choices=['true', 'false', ''], help=r'whether this server is a gateway')
+    parser.add_argument('-u', '--socket', default='/var/run/alfred/alfred.sock', help=r'unix socket of the alfred server')
+    parser.add_argument('--neighbors', default=NEIGHBORS, help=r'batman-adv neighbour table')
+    parser.add_argument('--sysfs', default=SYSFS_NET, help=r'sysfs directory of the network interfaces')
+    parser.add_argument('--state', default='/var/run/alfred_announce.state', help=r'file to remember the last push in')
+    parser.add_argument('--refresh', type=float, default=240, help=r'seconds after which unchanged data is pushed again (must stay below the 600 seconds alfred keeps data)')
+    parser.add_argument('--interval', type=float, help=r'keep running and check for changes every that many seconds')
+    parser.add_argument('--check', help=r'validate the data against the schema of map-backend.py and print it', action='store_true')
+    args = parser.parse_args()
+
+    properties = {}
+    if args.name:
+        properties['name'] = args.name[:31]
+    if args.firmware:
+        properties['firmware'] = args.firmware
+    if args.community:
+        properties['community'] = args.community
+    if args.vpn:
+        properties['vpn'] = boolean[args.vpn]
+    if args.gateway:
+        properties['gateway'] = boolean[args.gateway]
+
+    announcer = Announcer(properties, args.neighbors, args.sysfs)
+
+    if args.check:
+        payload = announcer.payload()
+        check(payload)
+        print(payload.decode('utf-8'))
+        return 0
+
+    state = State(args.state)
+    while True:
+        start = time.perf_counter()
+        try:
+            pushed = announce(announcer, state, args)
+        except OSError as e:
+            # e.g. alfred was restarted, try again next time
+            if args.interval is None:
+                raise
+            sys.stderr.write("Announcing failed: {}\n".format(e))
+            pushed = False
+        if pushed:
+            print("Announced map information in {:.1f} ms".format((time.perf_counter() - start) * 1000))
+
+        if args.interval is None:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
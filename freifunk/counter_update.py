@@ -5,13 +5,22 @@ import os
 import json
 import re
 import subprocess
+import datetime
+
+import snapshot
 
 
 '''
 This script sets the text values for fields labeled
 "node_counter" and "client_counter", "gateway_counter" and "date_updated" of a SVG file.
-
-The input file is the same nodes.json file that the meshviewer uses.
+The file is only written (and "date_updated" set) if a counter changed or
+"date_updated" is older than an hour, so that it still tells when the
+counters were last current.
+
+The input file is either the binary snapshot written by map-backend.py
+(--snapshot, read via snapshot.py without parsing the whole file), the
+statistics written by map-backend.py (--stats) or the same nodes.json file
+that the meshviewer uses.
 '''
 def execute(args):
 	p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
@@ -21,7 +30,7 @@ def execute(args):
 def main(argv):
 
 	if not (len(argv) == 3 or len(argv) == 4):
-		print("Usage: {} <json-file> <svg-file> [<community>]".format(argv[0]))
+		print("Usage: {} <snapshot-or-json-file> <svg-file> [<community>]".format(argv[0]))
 		return 0
 
 	prog = argv[0]
@@ -51,42 +60,95 @@ def main(argv):
 		else:
 			return content
 
-	json_content = ""	
-	with open(json_path, 'r') as json_file:
-		json_content = json_file.read()
+	def getSVGText(content, label_id):
+		pattern = r'(.*?<text[^>]*?"'+label_id+'"[^>]*?>\s*<tspan[^>]*>)([^<>]*)(</tspan>.*)$'
+		m = re.match(pattern, content, re.DOTALL)
+		if m:
+			return m.group(2)
+		else:
+			return None
+
+	def isOutdated(date_text):
+		if date_text is None:
+			# no date to update
+			return False
+		try:
+			date = datetime.datetime.strptime(date_text.strip("'\n "), '%Y-%m-%d %H:%M:%S')
+		except ValueError:
+			return True
+		return datetime.datetime.now() - date >= datetime.timedelta(hours=1)
+
+	def countSnapshot(path):
+		with snapshot.Snapshot(path) as nodes:
+			totals = nodes.totals(community)
+		return (totals.online, totals.clients, totals.gateways)
+
+	def countJSON(path):
+		json_content = ""
+		with open(path, 'r') as json_file:
+			json_content = json_file.read()
+
+		if len(json_content) == 0:
+			return None
+
+		decoded = json.loads(json_content)
+
+		#statistics written by map-backend.py --stats
+		if isinstance(decoded.get("communities", None), dict):
+			totals = { "online": 0, "clients": 0, "gateways": 0 }
+			for name, values in decoded["communities"].items():
+				if community and community != name:
+					continue
+				for key in totals:
+					totals[key] += values[key]
+			return (totals["online"], totals["clients"], totals["gateways"])
+
+		node_counter = 0
+		client_counter = 0
+		gateway_counter = 0
+
+		for element in decoded["nodes"]:
+			if not element.get("is_online", False):
+				continue
+
+			if community and community != element.get("site_code", None):
+				continue
+
+			node_counter += 1
+			client_counter += element.get("clients", 0)
+
+			if element.get("is_gateway", False):
+				gateway_counter += 1
+
+		return (node_counter, client_counter, gateway_counter)
+
+	if snapshot.is_snapshot(json_path):
+		counters = countSnapshot(json_path)
+	else:
+		counters = countJSON(json_path)
 
-	if len(json_content) == 0:
+	if counters is None:
 		sys.stderr.write(
 			"{}: File is empty: {}\n".format(prog, json_path)
 		)
 		return 1
 
-	decoded = json.loads(json_content)
-	node_counter = 0
-	client_counter = 0
-	gateway_counter = 0
-
-	for element in decoded["nodes"]:
-		if not element.get("is_online", False):
-			continue
-
-		if community and community != element.get("site_code", None):
-			continue
-
-		node_counter += 1
-		client_counter += element.get("clients", 0)
-
-		if element.get("is_gateway", False):
-			gateway_counter += 1
+	node_counter, client_counter, gateway_counter = counters
 
 	#print("gateway_counter: {}".format(gateway_counter))
 	#print("client_counter: {}".format(client_counter))
 	#print("node_counter: {}".format(node_counter))
 
-	svg_content = readSVG(svg_path)
-	svg_content = setSVGText(svg_content, "gateway_counter", str(gateway_counter))
+	old_content = readSVG(svg_path)
+	svg_content = setSVGText(old_content, "gateway_counter", str(gateway_counter))
 	svg_content = setSVGText(svg_content, "node_counter", str(node_counter))
 	svg_content = setSVGText(svg_content, "client_counter", str(client_counter))
+
+	#keep the file (and the caches of browsers) if no counter changed,
+	#but renew the date every hour
+	if svg_content == old_content and not isOutdated(getSVGText(old_content, "date_updated")):
+		return 0
+
 	svg_content = setSVGText(svg_content, "date_updated", execute(["date", "+'%Y-%m-%d %T'"]))
 
 	writeSVG(svg_path, svg_content)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+'''
+Write files only if their content changed and keep a manifest of them.
+
+The manifest is a JSON file mapping the path of each file (relative to the
+directory of the manifest, i.e. the URL path if it is kept in the document
+root) to the SHA-1 of its content, its size and mtime. Since files are only
+replaced when their content changes, their mtime (and hence the ETag and
+Last-Modified headers of the webserver) stays the same as long as the
+content does. Files outside of the directory of the manifest are written
+the same way but not recorded, so that it does not publish them.
+
+map-backend.py keeps its outputs in a manifest with ``--manifest``. Files
+written by other programs can be added with::
+
+    ./manifest.py /var/www/manifest.json /var/www/index.html /var/www/counter.svg
+
+License: CC0 1.0
+'''
+
+import os
+import sys
+import json
+import hashlib
+
+
+class Manifest:
+    r'''
+    The manifest stored at ``path``. Without a ``path`` nothing is stored
+    and unchanged files are detected by reading them.
+    '''
+    def __init__(self, path = None):
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path)) if path else None
+        self.entries = {}
+        self.content = None
+        self.written = []
+        self.unchanged = []
+
+        if path and os.path.isfile(path):
+            with open(path, 'r') as file:
+                self.content = file.read()
+            try:
+                self.entries = json.loads(self.content)
+            except ValueError:
+                # rebuilt from the files
+                self.entries = {}
+
+    def key(self, path):
+        r'''
+        Return the key of ``path`` in the manifest or ``None`` if it is not
+        recorded (since it is outside of the directory of the manifest).
+        '''
+        if not self.root:
+            return path
+        key = os.path.relpath(os.path.abspath(path), self.root)
+        if key == os.pardir or key.startswith(os.pardir + os.sep):
+            return None
+        return key
+
+    def digest(self, path):
+        r'''
+        Return the SHA-1 of the current content of ``path`` (``None`` if it
+        does not exist). The file is only read if it changed since it was
+        recorded in the manifest.
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        entry = self.entries.get(self.key(path), None)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry['sha1']
+
+        with open(path, 'rb') as file:
+            return hashlib.sha1(file.read()).hexdigest()
+
+    def record(self, path, digest = None):
+        r'''
+        Record the current state of ``path`` in the manifest.
+        '''
+        key = self.key(path)
+        if key is None:
+            return
+
+        stat = os.stat(path)
+        self.entries[key] = {
+            'sha1': digest or self.digest(path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime
+        }
+
+    def write(self, path, data):
+        r'''
+        Replace ``path`` (atomically) by ``data`` unless it already has this
+        content. Returns whether the file was written.
+        '''
+        digest = hashlib.sha1(data).hexdigest()
+        if digest == self.digest(path):
+            self.unchanged.append(path)
+            self.record(path, digest)
+            return False
+
+        with open(path + '.tmp', 'wb') as file:
+            file.write(data)
+        os.replace(path + '.tmp', path)
+
+        self.written.append(path)
+        self.record(path, digest)
+        return True
+
+    def save(self):
+        if not self.path:
+            return
+
+        # drop files that were removed (or are outside of the root, which
+        # older versions recorded)
+        for key in list(self.entries):
+            if not os.path.isfile(os.path.join(self.root, key)) or self.key(os.path.join(self.root, key)) is None:
+                del self.entries[key]
+
+        content = json.dumps(self.entries, indent=2, sort_keys=True)
+        if content == self.content:
+            return
+
+        with open(self.path + '.tmp', 'w') as file:
+            file.write(content)
+        os.replace(self.path + '.tmp', self.path)
+        self.content = content
+
+    def report(self):
+        if self.written or self.unchanged:
+            print("Wrote {} files, {} unchanged".format(len(self.written), len(self.unchanged)))
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Record files in a manifest (see map-backend.py --manifest)')
+    parser.add_argument('manifest', help=r'manifest file')
+    parser.add_argument('files', nargs='+', help=r'files to record')
+    args = parser.parse_args()
+
+    manifest = Manifest(args.manifest)
+    for path in args.files:
+        if os.path.isfile(path):
+            manifest.record(path)
+    manifest.save()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,20 @@
+r'''
+Convert data received from alfred (ffbi format) to formats accepted by
+meshviewer, ffmap and others; see map-backend.py for the command line
+interface.
+
+Modules:
+
+- ``core``: nodes, links and the time of the current run
+- ``parser``: parse and validate the alfred data and the aliases
+- ``storage``: store the nodes between runs
+- ``online``: track whether the nodes are online over many runs
+- ``serializer``: JSON serialization and reuse of rendered fragments
+- ``alfred``: read the data from the alfred socket
+- ``meshviewer``, ``ffmap``, ``nodelist``, ``stats``, ``search``, ``binary``,
+  ``zone``, ``services``: the output formats
+- ``query``, ``watch``: the long running modes
+- ``cli``: the command line interface
+
+Submodules are imported on demand only, importing this package is free.
+'''
@@ -0,0 +1,116 @@
+r'''
+Read data from the alfred server over its unix socket, several data types
+at once (like ``alfred -r``, but without running it once per type).
+'''
+
+import os
+import time
+import struct
+import socket
+import selectors
+
+# see packet.h of alfred
+ALFRED_PUSH_DATA = 0
+ALFRED_REQUEST = 2
+ALFRED_STATUS_ERROR = 4
+ALFRED_VERSION = 0
+
+MAP_DATA_TYPE = 64
+SERVICE_DATA_TYPE = 91
+
+# type, version, length
+TLV = struct.Struct('!BBH')
+
+# transaction id, sequence number
+TRANSACTION = struct.Struct('!HH')
+
+# source MAC and the TLV of the data
+DATA = struct.Struct('!6sBBH')
+
+class Request:
+    r'''
+    A request for the data of ``data_type`` on its own connection to the
+    alfred server; :meth:`feed` parses the answer as it arrives.
+    '''
+    def __init__(self, path, data_type):
+        self.data_type = data_type
+        self.transaction = struct.unpack('!H', os.urandom(2))[0]
+        self.buffer = bytearray()
+        self.entries = []
+        self.error = None
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        # requested type and transaction id
+        self.socket.sendall(TLV.pack(ALFRED_REQUEST, ALFRED_VERSION, 3) + struct.pack('!BH', data_type, self.transaction))
+        self.socket.setblocking(False)
+
+    def feed(self, data):
+        self.buffer += data
+        offset = 0
+        while len(self.buffer) - offset >= TLV.size:
+            packet_type, version, length = TLV.unpack_from(self.buffer, offset)
+            if len(self.buffer) - offset < TLV.size + length:
+                break
+            packet = bytes(self.buffer[offset + TLV.size:offset + TLV.size + length])
+            offset += TLV.size + length
+
+            if packet_type == ALFRED_STATUS_ERROR:
+                self.error = "alfred reported an error for data type {}".format(self.data_type)
+            elif packet_type == ALFRED_PUSH_DATA:
+                self.parse(packet)
+        del self.buffer[:offset]
+
+    def parse(self, packet):
+        offset = TRANSACTION.size
+        while offset + DATA.size <= len(packet):
+            source, data_type, version, length = DATA.unpack_from(packet, offset)
+            offset += DATA.size
+            if data_type == self.data_type:
+                self.entries.append((':'.join('{:02x}'.format(b) for b in source), packet[offset:offset + length]))
+            offset += length
+
+def request(path, data_types, timeout = 10.0):
+    r'''
+    Return two dictionaries for the ``data_types`` read from the alfred
+    server listening on the unix socket ``path``: data type => list of
+    ``(mac, data)`` for the types that were read and data type => error
+    message for the others (if alfred reported an error or the answer was
+    not complete within ``timeout`` seconds).
+
+    The requests are sent at once and answered concurrently, so reading
+    several types takes about as long as reading one (a secondary alfred
+    server may take several seconds to get the data from its primary).
+    Raises ``OSError`` if the socket cannot be used at all.
+    '''
+    requests = [Request(path, data_type) for data_type in data_types]
+    deadline = time.monotonic() + timeout
+
+    with selectors.DefaultSelector() as selector:
+        for request in requests:
+            selector.register(request.socket, selectors.EVENT_READ, request)
+
+        pending = len(requests)
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                events = selector.select(remaining) if remaining > 0 else []
+                if not events:
+                    for key in selector.get_map().values():
+                        key.data.error = "no complete answer from alfred for data type {} within {} seconds".format(key.data.data_type, timeout)
+                    break
+                for key, mask in events:
+                    data = key.fileobj.recv(65536)
+                    if data:
+                        key.data.feed(data)
+                        continue
+                    # the server closes the connection after the last packet
+                    selector.unregister(key.fileobj)
+                    pending -= 1
+        finally:
+            for request in requests:
+                request.socket.close()
+
+    data = { request.data_type: request.entries for request in requests if not request.error }
+    errors = { request.data_type: request.error for request in requests if request.error }
+    return data, errors
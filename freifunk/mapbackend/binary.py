@@ -0,0 +1,47 @@
+r'''
+Render the nodes to the records of a binary snapshot (see snapshot.py next
+to map-backend.py).
+'''
+
+def snapshot_node(node):
+    r'''
+    Render this node to a record of a binary snapshot (see snapshot.py).
+    '''
+    import snapshot
+
+    properties = node.properties
+    location = node.has_location()
+
+    return snapshot.Node(
+        mac = node.mac,
+        online = node.online,
+        gateway = properties.get('gateway', False),
+        vpn = properties.get('vpn', False),
+        clients = properties.get('clientcount', 0),
+        uptime = properties.get('uptime', None) or 0,
+        latitude = float(properties['latitude']) if location else None,
+        longitude = float(properties['longitude']) if location else None,
+        firstseen = node.firstseen,
+        lastseen = node.lastseen,
+        loadavg = properties.get('loadavg', 0),
+        memory_usage = properties.get('memory_usage', 0),
+        rootfs_usage = properties.get('rootfs_usage', 0),
+        name = properties.get('name', node.mac),
+        community = properties.get('community', ''),
+        firmware = properties.get('firmware', ''),
+        model = properties.get('model', ''),
+        contact = properties.get('contact', ''),
+        autoupdater = properties.get('autoupdater', ''))
+
+def render_snapshot(nodes, links, fragments = None):
+    r'''
+    Return a dictionary MAC => snapshot record to be written with
+    ``snapshot.write``; all MACs of a node share its record.
+    '''
+    records = {}
+    for mac, node in nodes.items():
+        if node.mac not in records:
+            records[node.mac] = snapshot_node(node)
+        records[mac] = records[node.mac]
+
+    return records
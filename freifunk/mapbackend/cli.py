@@ -0,0 +1,262 @@
+r'''
+The command line interface of map-backend.py.
+
+Only what an invocation needs is imported: the parser (and jsonschema) when
+alfred data is read, each format when it is written, the storage when nodes
+are loaded or stored.
+'''
+
+import sys
+import datetime
+
+from . import core
+from .core import isFile, removeOldNodes, removeUnknownCommunities
+from .serializer import JsonSerializer, FragmentCache
+
+
+def readAlfred(args):
+    r'''
+    Return the data read from the alfred socket ``args.socket`` (data type
+    => list of ``(mac, data)``): the map data and, if they are written, the
+    services, requested at once. Returns ``None`` without a socket.
+
+    Raises ``OSError`` if the map data cannot be read; other data types
+    that cannot be read are reported and left out.
+    '''
+    if not args.socket:
+        return None
+
+    from . import alfred
+
+    data_types = [alfred.MAP_DATA_TYPE]
+    if args.services:
+        data_types.append(alfred.SERVICE_DATA_TYPE)
+    data, errors = alfred.request(args.socket, data_types, args.alfred_timeout)
+    if alfred.MAP_DATA_TYPE in errors:
+        raise OSError(errors[alfred.MAP_DATA_TYPE])
+    for data_type in sorted(errors):
+        sys.stderr.write("{}\n".format(errors[data_type]))
+    return data
+
+def mergeMaps(args, nodes, aliases, reported = None, data = None, tracker = None):
+    r'''
+    Merge the alfred data (``data`` as returned by :func:`readAlfred` or
+    else the file ``args.maps``) and the ``aliases`` into the ``nodes`` of
+    the last run. Returns the links found.
+
+    If ``reported`` is given, the properties of the nodes that are online
+    are stored in it (by primary MAC) before the aliases are applied. If
+    ``tracker`` is given, it is advanced by this run (see
+    :class:`mapbackend.online.OnlineTracker`).
+    '''
+    from .parser import Budget, parseMaps, parseData, applyAliases, linkReverse
+
+    # (smac, dmac) => Link
+    links = {}
+
+    if args.communities:
+        removeUnknownCommunities(nodes, args.communities)
+
+    removeOldNodes(nodes, datetime.timedelta(days = 7))
+
+    budget = Budget(args.max_links, args.max_interfaces, args.max_bytes, args.max_line_seconds,
+        args.max_total_links, args.max_total_bytes)
+    if data is not None:
+        from .alfred import MAP_DATA_TYPE
+        parseData(data[MAP_DATA_TYPE], nodes, links, budget)
+    else:
+        parseMaps(args.maps, nodes, links, budget)
+    budget.report()
+
+    if tracker is not None:
+        updated = tracker.update(nodes)
+        print("Updated the online state of {} nodes".format(updated))
+
+    if args.quarantine:
+        with open(args.quarantine, 'wb') as file:
+            JsonSerializer(args.pretty, args.json_backend).dump({
+                'timestamp': core.now_timestamp.isoformat(),
+                'nodes': budget.quarantine
+            }, file)
+
+    if reported is not None:
+        for node in nodes.values():
+            if node.online:
+                reported[node.mac] = dict(node.properties)
+
+    applyAliases(nodes, aliases)
+
+    linkReverse(links)
+
+    return links
+
+def writeOutputs(args, nodes, links, data = None, tracker = None):
+    import manifest
+
+    serializer = JsonSerializer(args.pretty, args.json_backend)
+
+    # pretty output is sorted and indented, which fragments are not
+    fragments = None if args.pretty else FragmentCache(serializer)
+    output = fragments or serializer
+
+    # files are only replaced if their content changed
+    files = manifest.Manifest(args.manifest)
+
+    # the formats are only imported if they are written
+    if args.meshviewer_org:
+        from .meshviewer import render_meshviewer_org
+        nodes_json = render_meshviewer_org(nodes, links, fragments)
+        files.write(args.meshviewer_org, output.dumps(nodes_json))
+
+    if args.meshviewer_nodes:
+        from .meshviewer import render_meshviewer_nodes_old
+        nodes_json = render_meshviewer_nodes_old(nodes, links, fragments)
+        files.write(args.meshviewer_nodes, output.dumps(nodes_json))
+
+    if args.meshviewer_graph:
+        from .meshviewer import render_meshviewer_graph_old
+        graph_json = render_meshviewer_graph_old(nodes, links, fragments)
+        files.write(args.meshviewer_graph, output.dumps(graph_json))
+
+    if args.ffmap_nodes:
+        from .ffmap import render_ffmap
+        nodes_json = render_ffmap(nodes, links, fragments)
+        files.write(args.ffmap_nodes, output.dumps(nodes_json))
+
+    if args.nodelist:
+        from .nodelist import render_nodelist
+        nodes_json = render_nodelist(nodes, links, fragments)
+        files.write(args.nodelist, output.dumps(nodes_json))
+
+    if args.stats:
+        from .stats import render_stats
+        files.write(args.stats, serializer.dumps(render_stats(nodes, links)))
+
+    if args.search_index:
+        from .search import SearchIndex
+        SearchIndex(args.search_index, serializer, files).write(nodes)
+
+    if args.services:
+        from .parser import Budget, parseServices
+        from .services import render_services
+        from .alfred import SERVICE_DATA_TYPE
+        if data is not None:
+            # None if they could not be read, keep the last ones then
+            entries = data.get(SERVICE_DATA_TYPE, None)
+        elif isFile(args.services_maps):
+            with open(args.services_maps, 'r') as file:
+                entries = [line for line in file if line.strip()]
+        else:
+            entries = []
+        if entries is not None:
+            services = parseServices(entries, Budget(max_bytes = args.max_bytes))
+            files.write(args.services, serializer.dumps(render_services(nodes, services)))
+
+    if args.dns_zone:
+        from .zone import Zone
+        Zone(args.dns_origin, args.dns_zone, args.dns_template, args.dns_changes, args.dns_server).write(nodes, files)
+
+    if args.snapshot:
+        import snapshot
+        from .binary import render_snapshot
+        files.write(args.snapshot, snapshot.dumps(core.now_timestamp, render_snapshot(nodes, links)))
+
+    files.save()
+    files.report()
+
+    if fragments:
+        fragments.prune(nodes)
+        fragments.report()
+    else:
+        # pretty output is not built from fragments, forget them all
+        FragmentCache(serializer).prune(nodes)
+
+    if args.storage:
+        from .storage import saveNodes
+        saveNodes(args.storage, nodes, tracker)
+
+def update(args):
+    r'''
+    Run one full update: load the stored nodes, merge the alfred data and the
+    aliases into them, write all requested outputs and store the nodes again.
+    Returns the resulting ``nodes`` and ``links``.
+    '''
+    from .parser import loadAliases
+    from .storage import loadNodes
+    from .online import OnlineTracker
+
+    core.updateTimestamp()
+
+    # mac => node
+    nodes = {}
+    tracker = OnlineTracker()
+
+    # load old nodes that we have stored from the last call of this script,
+    # that way we can show nodes that are offline
+    if isFile(args.storage):
+        nodes = loadNodes(args.storage, tracker)
+
+    aliases = {}
+    if isFile(args.aliases):
+        aliases = loadAliases(args.aliases)
+
+    data = readAlfred(args)
+
+    links = mergeMaps(args, nodes, aliases, data = data, tracker = tracker)
+
+    writeOutputs(args, nodes, links, data, tracker)
+
+    return nodes, links
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser('Convert data received from alfred to a format accepted by meshviewer or ffmap')
+    parser.add_argument('-a', '--aliases', help=r'a dictionary of overwrites to replace (offending) properties of some nodes')
+    parser.add_argument('-m', '--maps', help=r'input file containing data collected by alfred')
+    parser.add_argument('-u', '--socket', help=r'read the data from the unix socket of alfred instead (all data types at once)')
+    parser.add_argument('--alfred-timeout', type=float, default=20.0, help=r'seconds to wait for alfred to answer on --socket')
+    parser.add_argument('--services-maps', help=r'input file containing services collected by alfred (alfred -r 91), if not read from --socket')
+    parser.add_argument('--pretty', help=r'pretty json output', action='store_true')
+    parser.add_argument('--json-backend', choices=JsonSerializer.BACKENDS, help=r'JSON library to use (default: the fastest one installed)')
+    parser.add_argument('--ffmap-nodes',help=r'output nodes.json file for ffmap (very old format)')
+    parser.add_argument('--meshviewer-nodes', help=r'output nodes.json file for meshviewer (old format)')
+    parser.add_argument('--meshviewer-graph', help=r'output graph.json file for meshviewer (old format)')
+    parser.add_argument('--meshviewer-org', help=r'output meshviewer.json file for meshviewer (https://meshviewer.org)')
+    parser.add_argument('--nodelist', help=r'output json file in nodelist format (for https://freifunk-karte.de).')
+    parser.add_argument('--stats', help=r'output json file with statistics of the nodes (totals per community, firmware/model/autoupdater histograms, load percentiles)')
+    parser.add_argument('--search-index', metavar='DIRECTORY', help=r'output directory for a search index over names, node ids and contacts (see SearchIndex)')
+    parser.add_argument('--snapshot', help=r'output binary snapshot of the nodes for local tools (see snapshot.py)')
+    parser.add_argument('--services', help=r'output json file with the services announced via alfred (type 91) and the gateways')
+    parser.add_argument('--dns-zone', help=r'output zone file with AAAA records of the nodes named after them (only written if records changed)')
+    parser.add_argument('--dns-origin', default='nodes.ffbi', help=r'domain of the zone written with --dns-zone (a zone of its own, delegated to the nodes)')
+    parser.add_argument('--dns-template', help=r'file with the SOA, NS and static records of the zone ({serial}, {origin}, {ttl} and {nameserver} are replaced)')
+    parser.add_argument('--dns-changes', help=r'file to append changed records of the zone to as nsupdate commands')
+    parser.add_argument('--dns-server', help=r'server to send the nsupdate commands to (primary of the zone)')
+    parser.add_argument('--manifest', help=r'output json file with the SHA-1, size and mtime of all outputs (e.g. for ETags)')
+    parser.add_argument('--storage', default='nodes_backup.bin', help=r'store old data between calls e.g. to remember node lastseen values')
+    parser.add_argument('-c', '--communities', nargs='+', help=r'Communities we want to filter for. Show all if none defined.')
+    parser.add_argument('--max-links', type=int, default=1000, help=r'reject nodes reporting more links')
+    parser.add_argument('--max-interfaces', type=int, default=64, help=r'reject nodes reporting links of more interface MACs')
+    parser.add_argument('--max-bytes', type=int, default=64 * 1024, help=r'reject nodes sending more (decompressed) bytes')
+    parser.add_argument('--max-line-seconds', type=float, default=1.0, help=r'reject nodes whose data takes longer to parse')
+    parser.add_argument('--max-total-links', type=int, default=500000, help=r'reject nodes once all nodes together reported that many links')
+    parser.add_argument('--max-total-bytes', type=int, default=256 * 1024 * 1024, help=r'reject nodes once all nodes together sent that many bytes')
+    parser.add_argument('--quarantine', help=r'output json file listing the nodes rejected for exceeding a limit')
+    parser.add_argument('--serve', metavar='[HOST:]PORT', help=r'keep running and answer HTTP queries about the nodes (see QueryServer)')
+    parser.add_argument('--refresh', type=int, default=300, help=r'seconds between checks for new alfred data in --serve mode (and between reads of --socket in --watch mode)')
+    parser.add_argument('--watch', help=r'keep running and render again whenever the maps input (or every --refresh seconds the data of --socket) or the aliases change', action='store_true')
+    parser.add_argument('--debounce', type=float, default=2.0, help=r'seconds without further changes to wait for before rendering in --watch mode')
+    args = parser.parse_args()
+
+    if not args.maps and not args.socket:
+        parser.error('one of --maps and --socket is required')
+
+    if args.serve:
+        from .query import serve
+        serve(args)
+    elif args.watch:
+        from .watch import watch
+        watch(args)
+    else:
+        update(args)
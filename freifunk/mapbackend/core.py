@@ -0,0 +1,208 @@
+r'''
+The nodes and links of the mesh and the time of the current run.
+
+Nothing here is imported from the formats, the parser or the storage, so
+this module is cheap to import.
+'''
+
+import os
+import datetime
+
+# the time of the current run, set by updateTimestamp() (and not when this
+# module is imported, so that long running processes get a current one)
+now_timestamp = None
+
+def updateTimestamp():
+    global now_timestamp
+    now_timestamp = datetime.datetime.utcnow().replace(microsecond=0)
+    return now_timestamp
+
+class Node:
+    r'''
+    A node in the freifunk network, identified by its primary MAC.
+
+    The ``version`` of a node changes whenever one of its ``RENDERED``
+    attributes changes; :class:`mapbackend.serializer.FragmentCache` keeps
+    the rendered node in ``fragments`` as long as the version stays the same.
+    '''
+    RENDERED = ('properties', 'online', 'lastseen', 'firstseen')
+
+    def __init__(self, mac, properties, online):
+        self.version = 0
+        self.fragments = {}
+        self.link_fragments = {}
+        self.mac = mac
+        self.properties = properties
+
+        if online:
+            self.lastseen = now_timestamp
+            self.firstseen = now_timestamp
+        else:
+            self.lastseen = None
+            self.firstseen = None
+
+        self.online = online
+        self.state = None # see mapbackend.online.OnlineState
+        self.search = None # see mapbackend.search.SearchIndex.tokens
+        self.dns = None # see mapbackend.zone.Zone.host
+        self.interfaces = set() # the interface MACs reported last (keys of this node besides mac)
+        self.index = None # the index of this node in the list produced for ffmap
+        self.done = False
+
+    def update_properties(self, properties, force = True):
+        r'''
+        Replace any properties with their respective values in ``properties``.
+        '''
+        if force:
+            ''' discard all previous properties '''
+            properties = dict(properties)
+            if 'force' in properties:
+                del properties['force']
+            # the renderers rely on these being set
+            properties.setdefault('gateway', False)
+            properties.setdefault('vpn', False)
+            self.properties = properties
+        else:
+            ''' add new key/value pairs only if not already set '''
+            for key, value in properties.items():
+                if not key in self.properties:
+                    if key == "force":
+                        continue
+
+                    if key == "name":
+                        value = value+"*"
+
+                    self.properties[key] = value
+                    self.version += 1
+
+    def __setattr__(self, name, value):
+        if name in Node.RENDERED and self.__dict__.get(name, None) != value:
+            self.__dict__['version'] = self.__dict__.get('version', 0) + 1
+        self.__dict__[name] = value
+
+    def __setstate__(self, state):
+        # nodes stored before fragments were cached
+        state.setdefault('version', 0)
+        state.setdefault('fragments', {})
+        state.setdefault('link_fragments', {})
+        # nodes stored before their online state was tracked
+        state.setdefault('state', None)
+        # nodes stored before the search index and the DNS zone kept their
+        # data here
+        state.setdefault('search', None)
+        state.setdefault('dns', None)
+        # nodes stored before their interface MACs were kept (see loadNodes)
+        state.setdefault('interfaces', set())
+        self.__dict__.update(state)
+
+    def has_location(self):
+        return ('longitude' in self.properties) and ('latitude' in self.properties)
+
+    def firmware_parts(self):
+        r'''
+        Return the base and the release of the firmware of this node.
+        '''
+        firmware = self.properties.get('firmware', '')
+        if '-' in firmware:
+            base, release = firmware.split('-', 1)
+            return base, release
+        return '-', firmware
+
+    # a printable representation (which is missing the links)
+    def __repr__(self):
+        from pprint import pformat
+        return r'Node({0!r}, {1!s}, online={2!r})'.format(self.mac, pformat(self.properties), self.online)
+
+class Link:
+    r'''
+    A link between two nodes.
+
+    A Link is associated to one :class:`Node`, the node which is the source of
+    the link. It has attributes ``smac`` and ``dmac`` which are MACs of the
+    interfaces which this link connects. (These are usually not the primary
+    MACs of the nodes which this link connects, i.e., ``link.smac !=
+    link.source.mac``.)
+
+    Typically, links come in pairs. There is a symmetric link with ``smac`` and
+    ``dmac`` interchanged. Once that symmetric link has been discovered, an
+    attribute ``reverse`` holds a reference to the symmetric link.
+
+    Additionally each link specifies a connection quality in the range `[0,1]`.
+    '''
+    def __init__(self, source, smac, dmac, quality):
+        self.source = source
+        self.smac = smac
+        self.dmac = dmac
+        self.quality = quality
+
+        self.reverse = None
+        # indicates if this object was processed for output already
+        self.done = False
+
+    def fragment_key(self, format):
+        r'''
+        Return everything that the rendering of this link in ``format``
+        depends on (besides ``smac`` and ``dmac``).
+        '''
+        key = (self.source.mac, self.reverse.source.mac, self.quality, self.reverse.quality,
+            self.source.properties['vpn'], self.reverse.source.properties['vpn'])
+        if format == 'meshviewer_org':
+            return key
+        return key + (self.source.index, self.reverse.source.index)
+
+    # a printable representation
+    def __repr__(self): return r'{0} (of {1}) -> {2} (of {3})'.format(self.smac, self.source.mac, self.dmac, self.reverse.source.mac if self.reverse else '?')
+
+def removeOldNodes(nodes, delta):
+    limit = now_timestamp - delta
+    old_keys = []
+
+    for key, node in nodes.items():
+        if node.lastseen < limit:
+            old_keys.append(key)
+
+    count = 0
+    for key in old_keys:
+        del nodes[key]
+        count += 1
+
+    print("Removed {} old nodes".format(count))
+
+# count unique node entries
+def countNodes(nodes):
+    for node in nodes.values():
+        node.done = False
+
+    count = 0
+    for node in nodes.values():
+        if node.done:
+            continue;
+        else:
+            node.done = True
+        count += 1
+
+    return count
+
+def foldText(text):
+    r'''
+    Return ``text`` in lower case and without accents (e.g. ``'Süd'`` becomes
+    ``'sud'``), for searching and host names.
+    '''
+    import unicodedata
+
+    text = unicodedata.normalize('NFKD', str(text)).casefold()
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+def isFile(path):
+    return path and os.path.isfile(path)
+
+def removeUnknownCommunities(nodes, communities):
+    del_keys = []
+
+    for key, node in nodes.items():
+        community = node.properties.get('community', None)
+        if community not in communities:
+            del_keys.append(key)
+
+    for key in del_keys:
+        del nodes[key]
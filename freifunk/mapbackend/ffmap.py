@@ -0,0 +1,134 @@
+r'''
+Render the nodes and links for ffmap (very old format).
+'''
+
+from . import core
+from .serializer import Fragments
+
+def ffmap_node(node):
+    r'''
+    Render this node (without its links) to a dictionary in a format
+    understood by ffmap.
+    '''
+    properties = node.properties
+    name = properties.get('name', None)
+    contact = properties.get('contact', None)
+    community = properties.get('community', None)
+    firmware = properties.get('firmware', None)
+    latitude = properties.get('latitude', None)
+    longitude = properties.get('longitude', None)
+    clientcount = properties.get('clientcount', None)
+    gateway = properties.get('gateway', False)
+    uptime = properties.get('uptime', None)
+    loadavg = properties.get('loadavg', None)
+    rootfs_usage = properties.get('rootfs_usage', None)
+    memory_usage = properties.get('memory_usage', None)
+    model = properties.get('model', None)
+    vpn = properties.get('vpn', False)
+
+    obj = {
+        'id': node.mac,
+        'flags': {
+            'gateway': gateway,
+            'vpn': vpn,
+            'online': node.online
+        }
+    }
+
+    if node.firstseen:
+        obj['firstseen'] = node.firstseen.isoformat()
+
+    if node.lastseen:
+        obj['lastseen'] = node.lastseen.isoformat()
+
+    if name:
+        obj['name'] = name
+
+    if contact:
+        obj['contact'] = contact
+
+    if community:
+        obj['community'] = community
+
+    if firmware:
+        obj['firmware'] = firmware
+
+    if latitude and longitude:
+        obj['geo'] = [latitude, longitude]
+
+    if clientcount:
+        obj['clientcount'] = clientcount
+
+    if uptime:
+        obj['uptime'] = uptime
+
+    if loadavg:
+        obj['loadavg'] = loadavg
+
+    if model:
+        obj['model'] = model
+
+    if loadavg:
+        obj['loadavg'] = loadavg
+
+    if rootfs_usage:
+        obj['rootfs_usage'] = rootfs_usage
+
+    if memory_usage:
+        obj['memory_usage'] = memory_usage
+
+    return obj
+
+def ffmap_link(link):
+    r'''
+    Render this link to a dictionary in a format understood by ffmap.
+    '''
+    if not link.reverse:
+        raise ValueError("link must have 'reverse' set to render to ffmap")
+
+    if link.source.index is None or link.reverse.source.index is None:
+        raise ValueError("link's source and target must have their 'index' set to render to ffmap")
+
+    return {
+        'id': '{}-{}'.format(link.smac,link.dmac),
+        'source': link.source.index,
+        'target': link.reverse.source.index,
+        'quality': '{:.3f}, {:.3f}'.format(link.quality, link.reverse.quality),
+        'type': 'vpn' if link.source.properties['vpn'] or link.reverse.source.properties['vpn'] else None
+    }
+
+def render_ffmap(nodes, links, fragments = None):
+    r'''
+    Return a JSON representation of ``nodes`` which is understood by ffmap.
+    '''
+    for link in links.values():
+        link.done = False
+
+    for node in nodes.values():
+        node.done = False
+
+    index = 0
+    all_nodes = Fragments() if fragments else []
+    for node in nodes.values():
+        if node.done:
+            continue
+        node.done = True
+        node.index = index
+        index += 1
+        all_nodes.append(fragments.node(node, 'ffmap', ffmap_node) if fragments else ffmap_node(node))
+
+    # render a list of links
+    all_links = Fragments() if fragments else []
+    for link in links.values():
+        if link.done:
+            continue
+        link.done = True
+        if link.reverse:
+            all_links.append(fragments.link(link, 'ffmap', ffmap_link) if fragments else ffmap_link(link))
+            link.reverse.done = True
+
+    return {
+        'meta' : { 'timestamp': core.now_timestamp.isoformat() },
+        'nodes' : all_nodes,
+        'links' :  all_links
+   }
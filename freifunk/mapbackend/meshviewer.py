@@ -0,0 +1,318 @@
+r'''
+Render the nodes and links for meshviewer: ``meshviewer.json`` (see
+https://meshviewer.org) and the old ``nodes.json`` and ``graph.json``.
+'''
+
+import re
+import datetime
+
+from . import core
+from .serializer import Fragments
+
+def meshviewer_org_node(node):
+    properties = node.properties
+    name = properties.get('name', node.mac)
+    community = properties.get('community', '')
+    firmware = properties.get('firmware', '')
+    clientcount = properties.get('clientcount', 0)
+    uptime = properties.get('uptime', '')
+    loadavg = properties.get('loadavg', 0)
+    model = properties.get('model', '')
+    rootfs_usage = properties.get('rootfs_usage', 0)
+    memory_usage = properties.get('memory_usage', 0)
+    addresses = properties.get('addresses', [])
+    autoupdater = properties.get('autoupdater', "")
+    gateway = properties.get('gateway', False)
+    vpn = properties.get('vpn', False)
+
+    def fmt_time(d):
+        return d.strftime("%Y-%m-%d %H:%M:%S")
+
+    if uptime:
+        # the uptime was reported when the node was last seen
+        uptime = fmt_time((node.lastseen or core.now_timestamp) - datetime.timedelta(seconds=int(uptime)))
+    else:
+        uptime = ''
+
+    obj = {
+        'location': {},
+        'firmware': {
+            'base': '-',
+            'release': '-'
+        },
+        'autoupdater': {
+            'enabled': (autoupdater != ""),
+            'branch': autoupdater
+        },
+        'nproc': 1
+    }
+
+    if 'contact' in properties:
+        obj['contact'] = properties['contact']
+
+    if node.has_location():
+        obj['location'] = {
+            'longitude': properties['longitude'],
+            'latitude': properties['latitude']
+        }
+
+    if node.firstseen:
+        obj['firstseen'] = node.firstseen.isoformat()
+
+    if node.lastseen:
+        obj['lastseen'] = node.lastseen.isoformat()
+
+    obj['is_online'] = node.online
+
+    # debounced over several runs, see mapbackend.online
+    state = node.state
+    if state is not None:
+        obj['is_online_debounced'] = state.online
+        obj['online_changed'] = state.changed.isoformat()
+        obj['flaps'] = len(state.flaps)
+        obj['uptime_ratio'] = state.ratio
+
+    obj['is_gateway'] = gateway
+    obj['clients'] = clientcount
+    obj['clients_wifi24'] = 0
+    obj['clients_wifi5'] = 0
+    obj['clients_other'] = 0
+    obj['rootfs_usage'] = rootfs_usage
+    obj['loadavg'] = loadavg
+    obj['memory_usage'] = memory_usage
+    obj['uptime'] = uptime
+    obj['gateway_nexthop'] = '-'
+    obj['gateway'] = '-'
+    obj['node_id'] = re.sub('[:]', '', node.mac)
+    obj['mac'] = node.mac
+    obj['addresses'] = addresses
+    obj['site_code'] = community
+    obj['hostname'] = name
+
+    obj['firmware']['base'], obj['firmware']['release'] = node.firmware_parts()
+
+    obj['model'] = model
+    obj['vpn'] = vpn
+
+    return obj
+
+def meshviewer_org_link(link):
+    r'''
+    Render this link to a dictionary in a format understood by meshviewer.
+    '''
+    if not link.reverse:
+        raise ValueError("link must have 'reverse' set to render for meshviewer_org")
+
+    link_type = "other"
+    if link.source.properties['vpn'] or link.reverse.source.properties['vpn']:
+        link_type = "vpn"
+
+    return {
+        'source': re.sub('[:]', '', link.source.mac),
+        'target': re.sub('[:]', '', link.reverse.source.mac),
+        'source_tq': (link.quality / 100),
+        'target_tq': (link.reverse.quality / 100),
+        'source_addr': link.source.mac,
+        'target_addr': link.reverse.source.mac,
+        'type': link_type
+    }
+
+def meshviewer_old_node(node):
+    properties = node.properties
+
+    name = properties.get('name', node.mac)
+    contact = properties.get('contact', None)
+    community = properties.get('community', None)
+    firmware = properties.get('firmware', None)
+    longitude = properties.get('longitude', None)
+    latitude = properties.get('latitude', None)
+    clientcount = properties.get('clientcount', 0)
+    uptime = properties.get('uptime', None)
+    loadavg = properties.get('loadavg', None)
+    model = properties.get('model', None)
+    rootfs_usage = properties.get('rootfs_usage', None)
+    memory_usage = properties.get('memory_usage', None)
+    addresses = properties.get('addresses', None)
+
+    obj = {
+        'statistics' : {},
+        'nodeinfo' : {
+            'network' : {
+                'mac': node.mac
+            }
+        }
+    }
+
+    if uptime:
+        obj['statistics']['uptime'] = uptime
+
+    obj['statistics']['clients'] = clientcount
+
+    if loadavg:
+        obj['statistics']['loadavg'] = loadavg
+
+    if rootfs_usage:
+        obj['statistics']['rootfs_usage'] = rootfs_usage
+
+    if memory_usage:
+        obj['statistics']['memory_usage'] = memory_usage
+
+    if addresses:
+        obj['nodeinfo']['network']['addresses'] = addresses
+
+    obj['nodeinfo']['hostname'] = name
+    obj['nodeinfo']['node_id'] = re.sub('[:]', '', node.mac)
+
+    if contact:
+        obj['nodeinfo']['owner'] = { 'contact' : contact }
+
+    if longitude and latitude:
+        obj['nodeinfo']['location'] = {
+            'longitude': longitude,
+            'latitude': latitude
+        }
+
+    if firmware:
+        obj['nodeinfo']['software'] = {
+            'firmware' : { 'release' : firmware }
+        }
+
+    obj['nodeinfo']['system'] = {}
+    if community:
+        obj['nodeinfo']['system']['site_code'] = community
+
+    if properties['gateway']:
+        obj['nodeinfo']['system']['role'] = 'gateway'
+    else:
+        obj['nodeinfo']['system']['role'] = 'node'
+
+    if model:
+        obj['nodeinfo']['hardware'] = {
+            'model' : model
+        }
+
+    obj['flags'] = {
+        'online' : node.online,
+        'gateway' : properties['gateway']
+    }
+
+    if node.firstseen:
+        obj['firstseen'] = node.firstseen.isoformat()
+
+    if node.lastseen:
+        obj['lastseen'] = node.lastseen.isoformat()
+
+    return obj
+
+def meshviewer_old_link(link):
+    r'''
+    Render this link to a dictionary in a format understood by meshviewer.
+    '''
+    if not link.reverse:
+        raise ValueError("link must have 'reverse' set to render for meshviewer_old")
+
+    if link.source.index is None or link.reverse.source.index is None:
+        raise ValueError("link's source and target must have their 'index' set to render for meshviewer_old")
+
+    return {
+        'source': link.source.index,
+        'target': link.reverse.source.index,
+        "bidirect": True,
+        'tq': float('{:.3f}'.format((1. / link.quality + 1. / link.reverse.quality) / (2.0 * 256))),
+        'vpn': True if link.source.properties['vpn'] or link.reverse.source.properties['vpn'] else False
+    }
+
+def render_meshviewer_org(nodes, links, fragments = None):
+    for link in links.values():
+        link.done = False
+
+    for node in nodes.values():
+        node.done = False
+
+    all_nodes = Fragments() if fragments else []
+    all_links = []
+    for node in nodes.values():
+        if node.done:
+            continue
+        else:
+            node.done = True
+
+        all_nodes.append(fragments.node(node, 'meshviewer_org', meshviewer_org_node) if fragments else meshviewer_org_node(node))
+
+    # a dictionary (smac,dmac)->link which is used to discover the reverse of each link
+    all_links = Fragments() if fragments else []
+    for link in links.values():
+        if not link.done and link.reverse:
+            all_links.append(fragments.link(link, 'meshviewer_org', meshviewer_org_link) if fragments else meshviewer_org_link(link))
+            link.done = True
+            link.reverse.done = True
+
+    return {
+        'meta' : { 'timestamp': core.now_timestamp.isoformat() },
+        'nodes' : all_nodes,
+        'links' : all_links
+    }
+
+def render_meshviewer_nodes_old(nodes, links, fragments = None):
+    for link in links.values():
+        link.done = False
+
+    for node in nodes.values():
+        node.done = False
+
+    all_nodes = Fragments() if fragments else []
+    for node in nodes.values():
+        if node.done:
+            continue
+        else:
+            node.done = True
+
+        all_nodes.append(fragments.node(node, 'meshviewer_old', meshviewer_old_node) if fragments else meshviewer_old_node(node))
+
+    return {
+        'meta' : { 'timestamp': core.now_timestamp.isoformat() },
+        'version' : 2,
+        'nodes' : all_nodes
+    }
+
+def render_meshviewer_graph_old(nodes, links, fragments = None):
+    for link in links.values():
+        link.done = False
+
+    for node in nodes.values():
+        node.done = False
+
+    #add mapping between map and node_id
+    all_nodes = []
+    index = 0
+    for node in nodes.values():
+        if node.done:
+            continue
+        else:
+            node.done = True
+
+        node.index = index
+        all_nodes.append({
+            'node_id' : re.sub('[:]', '', node.mac),
+            'id' : node.mac
+        })
+        index += 1
+
+    # a dictionary (smac,dmac)->link which is used to discover the reverse of each link
+    all_links = Fragments() if fragments else []
+    for link in links.values():
+        if not link.done and link.reverse:
+            all_links.append(fragments.link(link, 'meshviewer_old', meshviewer_old_link) if fragments else meshviewer_old_link(link))
+            link.done = True
+            link.reverse.done = True
+
+    return {
+        'version' : 1,
+        'batadv' : {
+            'graph' : [],
+            'nodes' : all_nodes,
+            'multigraph' : False,
+            'directed' : False,
+            'links' : all_links
+        }
+    }
@@ -0,0 +1,62 @@
+r'''
+Render the nodes in the nodelist format (for https://freifunk-karte.de).
+'''
+
+import re
+
+from . import core
+from .serializer import Fragments
+
+def nodelist_node(node):
+    name = node.properties.get('name', node.mac)
+    contact = node.properties.get('contact', None)
+    longitude = node.properties.get('longitude', None)
+    latitude = node.properties.get('latitude', None)
+    clientcount = node.properties.get('clientcount', 0)
+
+    obj = {
+        'id': re.sub('[:]', '', node.mac),
+        'status': {
+            'online': node.online,
+            'clients': clientcount
+        }
+    }
+
+    if name:
+        obj['name'] = name
+
+    if node.firstseen:
+        obj['firstseen'] = node.firstseen.isoformat()
+
+    if node.properties['gateway']:
+        obj['node_type'] = 'Server'
+    else:
+        obj['node_type'] = 'AccessPoint'
+
+    if node.lastseen:
+        obj['status']['lastcontact'] = node.lastseen.isoformat()
+
+    if latitude and longitude:
+        obj['position'] = {
+            'lat': float(latitude),
+            'long': float(longitude)
+        }
+
+    return obj
+
+def render_nodelist(nodes, links, fragments = None):
+    all_nodes = Fragments() if fragments else []
+
+    for node in nodes.values():
+        all_nodes.append(fragments.node(node, 'nodelist', nodelist_node) if fragments else nodelist_node(node))
+
+    return {
+        "version": "1.0.1",
+        "updated_at": core.now_timestamp.isoformat(),
+        #"community": {
+        #    "name": "Freifunk Gothan",
+        #    "href": "https://.../meta.json"
+        #},
+        'nodes' : all_nodes,
+        'linked' : {}
+    }
@@ -0,0 +1,168 @@
+r'''
+Track whether the nodes are online over many runs: a debounced online
+status, flaps and the uptime ratio of each node.
+'''
+
+import datetime
+
+from . import core
+
+class OnlineState:
+    r'''
+    The online state of a node, kept with the node (``Node.state``).
+
+    ``raw`` is whether the node was seen in the last run and ``since`` the
+    tick (run) in which that last changed. ``online`` is the debounced
+    status and ``changed`` when it last changed. ``flaps`` are the times the
+    node appeared or disappeared within :attr:`OnlineTracker.FLAP_WINDOW`
+    and ``transitions`` the changes of ``online`` within
+    :attr:`OnlineTracker.WINDOW` as ``(time, online)`` (the first one is
+    the status at the start of the window). ``ratio`` is the fraction of
+    that window the node was online.
+    '''
+    __slots__ = ('raw', 'since', 'online', 'changed', 'flaps', 'transitions', 'ratio')
+
+    def __init__(self, tick, now):
+        self.raw = True
+        self.since = tick
+        self.online = True
+        self.changed = now
+        self.flaps = []
+        self.transitions = [(now, True)]
+        self.ratio = 1.0
+
+    def __getstate__(self):
+        return { name: getattr(self, name) for name in OnlineState.__slots__ }
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def ticks(self, tick):
+        r'''
+        Return the number of consecutive runs the node was seen (if ``raw``)
+        or missed in, up to ``tick``.
+        '''
+        return tick - self.since + 1
+
+    def flapping(self):
+        return len(self.flaps) >= OnlineTracker.FLAP_LIMIT
+
+class OnlineTracker:
+    r'''
+    Keeps the :class:`OnlineState` of the nodes up to date, one tick per
+    run. It is stored after the nodes in the node store (see
+    :func:`mapbackend.storage.saveNodes`).
+
+    A node is considered online once it was seen in ``UP`` consecutive runs
+    (``UP_FLAPPING`` if it is flapping, i.e., appeared or disappeared
+    ``FLAP_LIMIT`` times within ``FLAP_WINDOW``) and offline once it was
+    missed in ``DOWN`` consecutive runs. Nodes are online when they are seen
+    for the first time.
+
+    Only the nodes that appeared or disappeared in a run and the few nodes
+    whose state is still settling (debounced status not yet following,
+    recent flaps or transitions within ``WINDOW``) are updated, so a run
+    costs O(changed nodes) on top of comparing the sets of nodes seen.
+    '''
+    UP = 2
+    UP_FLAPPING = 6
+    DOWN = 3
+    FLAP_LIMIT = 4
+    FLAP_WINDOW = datetime.timedelta(hours = 1)
+    WINDOW = datetime.timedelta(days = 1)
+
+    def __init__(self):
+        self.tick = 0
+        # primary MACs of the nodes seen in the last run
+        self.seen = set()
+        # primary MACs of the nodes whose state must be updated every run
+        self.pending = set()
+
+    def update(self, nodes):
+        r'''
+        Advance by one run, in which the ``nodes`` that are ``online`` were
+        seen. Returns the number of nodes whose state was updated.
+        '''
+        self.tick += 1
+        now = core.now_timestamp
+
+        seen = {node.mac for node in nodes.values() if node.online}
+        changed = (seen ^ self.seen) | self.pending
+        self.seen = seen
+
+        for mac in changed:
+            node = nodes.get(mac, None)
+            if node is None or node.mac != mac:
+                # removed or renamed
+                self.seen.discard(mac)
+                self.pending.discard(mac)
+                continue
+
+            if self.step(node, mac in seen, now):
+                self.pending.add(mac)
+            else:
+                self.pending.discard(mac)
+
+        return len(changed)
+
+    def step(self, node, raw, now):
+        r'''
+        Update the state of ``node`` which was (not) seen in this run.
+        Returns whether it must be updated in the next run, too.
+        '''
+        state = node.state
+        if state is None:
+            node.state = state = OnlineState(self.tick, now)
+            node.version += 1
+
+        # what the formats show, see exposed()
+        exposed = OnlineTracker.exposed(state)
+
+        if raw != state.raw:
+            state.raw = raw
+            state.since = self.tick
+            state.flaps.append(now)
+        state.flaps = [time for time in state.flaps if time > now - self.FLAP_WINDOW]
+
+        if state.online != raw:
+            required = self.DOWN if not raw else (self.UP_FLAPPING if state.flapping() else self.UP)
+            if state.ticks(self.tick) >= required:
+                state.online = raw
+                state.changed = now
+                state.transitions.append((now, raw))
+
+        state.ratio = self.ratio(state, now)
+
+        if OnlineTracker.exposed(state) != exposed:
+            node.version += 1
+
+        return state.online != state.raw or len(state.flaps) > 0 or len(state.transitions) > 1
+
+    @staticmethod
+    def exposed(state):
+        return (state.online, state.changed, len(state.flaps), state.ratio)
+
+    def ratio(self, state, now):
+        r'''
+        Return the fraction of ``WINDOW`` (or of the time since the node was
+        first seen, if shorter) the node was online, rounded to three
+        digits. Transitions before the window are dropped.
+        '''
+        start = now - self.WINDOW
+        transitions = state.transitions
+        while len(transitions) > 1 and transitions[1][0] <= start:
+            transitions.pop(0)
+        if transitions[0][0] < start:
+            transitions[0] = (start, transitions[0][1])
+
+        total = (now - transitions[0][0]).total_seconds()
+        if total <= 0:
+            return 1.0 if state.online else 0.0
+
+        online = 0.0
+        for i, (time, status) in enumerate(transitions):
+            end = transitions[i + 1][0] if i + 1 < len(transitions) else now
+            if status:
+                online += (end - time).total_seconds()
+        return round(online / total, 3)
@@ -0,0 +1,519 @@
+r'''
+Parse and validate the data reported by the nodes via alfred and the
+aliases.
+'''
+
+import re
+import sys
+import zlib
+import time
+import json
+import os
+
+from . import core
+from .core import Node, Link, isFile
+
+class BudgetExceeded(ValueError):
+    r'''
+    Raised when the data of a node exceeds a limit of its :class:`Budget`.
+    '''
+    def __init__(self, mac, reason):
+        ValueError.__init__(self, "{}: {}".format(mac, reason))
+        self.mac = mac
+        self.reason = reason
+
+class Budget:
+    r'''
+    Resource limits for parsing the data reported via alfred.
+
+    Per node, the number of links (``max_links``), of distinct interface
+    MACs (``max_interfaces``), the size of the (decompressed) data
+    (``max_bytes``) and the time spent on its line (``max_seconds``) are
+    limited. For all nodes together, the total number of links and bytes
+    are (only nodes that were accepted count). Nodes exceeding a limit are
+    rejected and kept in ``quarantine`` (MAC => reason).
+
+    The time of a line is checked between the steps of parsing it, before
+    each expensive one (a step itself is not interrupted, but the other
+    limits bound how long it takes).
+    '''
+    def __init__(self, max_links = 1000, max_interfaces = 64, max_bytes = 64 * 1024, max_seconds = 1.0,
+            max_total_links = 500000, max_total_bytes = 256 * 1024 * 1024):
+        self.max_links = max_links
+        self.max_interfaces = max_interfaces
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.max_total_links = max_total_links
+        self.max_total_bytes = max_total_bytes
+
+        self.total_links = 0
+        self.total_bytes = 0
+        self.quarantine = {}
+
+    def exceeded(self, mac, reason):
+        self.quarantine[mac] = reason
+        raise BudgetExceeded(mac, reason)
+
+    def check_bytes(self, mac, count):
+        if count > self.max_bytes:
+            self.exceeded(mac, "more than {} bytes of data".format(self.max_bytes))
+        if self.total_bytes + count > self.max_total_bytes:
+            self.exceeded(mac, "total data of all nodes exceeds {} bytes".format(self.max_total_bytes))
+
+    def max_line(self):
+        r'''
+        The maximum length of a line of ``alfred -r`` output within the
+        limits: every byte is escaped to at most four characters.
+        '''
+        return 4 * self.max_bytes + 64
+
+    def check_line(self, line):
+        if len(line) > self.max_line():
+            match = re.match(r'\{\s*"([0-9a-f:]{17})"', line)
+            self.exceeded(match.group(1) if match else '?', "line longer than {} characters".format(self.max_line()))
+
+    def check_links(self, mac, links):
+        if len(links) > self.max_links:
+            self.exceeded(mac, "more than {} links".format(self.max_links))
+        if self.total_links + len(links) > self.max_total_links:
+            self.exceeded(mac, "total links of all nodes exceed {}".format(self.max_total_links))
+
+    def check_interfaces(self, mac, links):
+        if len(set(link['smac'] for link in links)) > self.max_interfaces:
+            self.exceeded(mac, "more than {} interface MACs".format(self.max_interfaces))
+
+    def charge(self, mac, count, links):
+        r'''
+        Charge the ``count`` bytes and the ``links`` of the node ``mac``,
+        which was accepted, to the totals.
+        '''
+        self.total_bytes += count
+        self.total_links += len(links)
+
+    def check_time(self, mac, start):
+        if time.monotonic() - start > self.max_seconds:
+            self.exceeded(mac, "parsing took more than {} seconds".format(self.max_seconds))
+
+    def report(self):
+        if self.quarantine:
+            sys.stderr.write("Quarantined {} nodes:\n".format(len(self.quarantine)))
+            for mac, reason in sorted(self.quarantine.items()):
+                sys.stderr.write("  {}: {}\n".format(mac, reason))
+
+class AlfredParser:
+    r'''
+    A class providing static methods to parse and validate data reported by
+    nodes via alfred.
+    '''
+    MAC_RE = "^([0-9a-f]{2}:){5}[0-9a-f]{2}$"
+    GEO_RE = "^\d{1,3}\.\d{1,8} {1,3}\d{1,3}\.\d{1,8}$"
+    MAC_SCHEMA = { "type": "string", "pattern": MAC_RE }
+    ALFRED_NODE_SCHEMA = {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {
+            "geo": { "type": "string", "pattern": GEO_RE }, #deprecated in favor of longitude/latitude
+            "name": { "type": "string", "maxLength": 32 },
+            "contact": { "type": "string", "maxLength": 50 },
+            "firmware": { "type": "string", "maxLength": 32 },
+            "community": { "type": "string", "maxLength": 32 },
+            "autoupdater": { "type": "string", "maxLength": 32 },
+
+            'longitude' : { "type": "number" },
+            'latitude' : { "type": "number" },
+            'model': { "type": "string", "maxLength": 50 },
+            'uptime': { "type": "number" },
+            'loadavg': { "type": "number" },
+            'rootfs_usage' : { "type": "number" },
+            'memory_usage' : { "type": "number" },
+            'addresses' :  {"type": "array", "items": { "type": "string" } },
+
+            "clientcount": { "type": "integer", "minimum": 0, "maximum": 255 },
+            "gateway": { "type": "boolean" },
+            "vpn": { "type": "boolean" },
+            "links": {
+                "type": "array",
+                "items": { "$ref": "#/definitions/link" }
+            }
+        },
+        "definitions": {
+            "MAC": MAC_SCHEMA,
+            "link": {
+                "type": "object",
+                "properties": {
+                    "smac": { "$ref": "#/definitions/MAC" },
+                    "dmac": { "$ref": "#/definitions/MAC" },
+                    "qual": { "type": "number" },
+                    "type": { "enum": [ "vpn" ] },
+                },
+                "required": ["smac", "dmac"],
+                "additionalProperties": False
+            }
+        }
+    }
+
+    # status pages and other services announced via alfred (type 91)
+    SERVICE_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "link": { "type": "string", "maxLength": 256, "pattern": "^https?://" },
+            "label": { "type": "string", "maxLength": 64 }
+        },
+        "required": ["link", "label"]
+    }
+
+    # schema name => jsonschema validator, see validate()
+    VALIDATORS = {}
+
+    ALIASES_SCHEMA = {
+        "type": "object",
+        "patternProperties": {
+            MAC_RE : {
+                "type": "object",
+                "additionalProperties": False,
+                "properties": {
+                    "geo": { "type": "array", "items": [{'type' : 'number'}, {'type' : 'number'}]}, #deprecated in favor of longitude/latitude
+                    'latitude' : { "type": "number" },
+                    'longitude' : { "type": "number" },
+                    'model': { "type": "string", "maxLength": 50 },
+                    'uptime': { "type": "number" },
+                    'loadavg': { "type": "number" },
+                    "name": { "type": "string", "maxLength": 32 },
+                    "contact": { "type": "string", "maxLength": 32 },
+                    "firmware": { "type": "string", "maxLength": 32 },
+                    "community": { "type": "string", "maxLength": 32 },
+                    "autoupdater": { "type": "string", "maxLength": 32 },
+                    "clientcount": { "type": "integer", "minimum": 0, "maximum": 255 },
+                    "gateway": { "type": "boolean" },
+                    "vpn": { "type": "boolean" },
+                    "force": { "type": "boolean" }
+                }
+            }
+        }
+    }
+
+    @staticmethod
+    def validate(instance, schema):
+        r'''
+        Validate ``instance`` against the schema named ``schema`` (e.g.
+        ``'ALFRED_NODE_SCHEMA'``). jsonschema is only imported and each
+        validator only built once.
+        '''
+        validator = AlfredParser.VALIDATORS.get(schema, None)
+        if validator is None:
+            import jsonschema
+            validator = jsonschema.Draft4Validator(getattr(AlfredParser, schema))
+            AlfredParser.VALIDATORS[schema] = validator
+        validator.validate(instance)
+
+    @staticmethod
+    def _parse_constant(name):
+        r'''
+        Reject ``NaN``, ``Infinity`` and ``-Infinity``, which ``json.loads``
+        accepts but are not valid JSON (and cannot be written to the
+        outputs).
+        '''
+        raise ValueError("invalid number: {0}".format(name))
+
+    @staticmethod
+    def _parse_string(s):
+        r'''
+        Strip an escaped string which is enclosed in double quotes and
+        unescape.
+        '''
+        if s[0] != '"' or s[-1] != '"':
+            raise ValueError("malformatted string: {0:r}".format(s))
+        return bytes(s[1:-1], 'ascii').decode('unicode-escape')
+
+    @staticmethod
+    def split_line(item, budget):
+        r'''
+        Return the MAC and the (still compressed) data of a line as returned
+        by ``alfred -r``.
+
+        Such lines consist of a nodes MAC address and an escaped string of
+        the data.
+        '''
+        # parse the strange output produced by alfred { MAC, JSON },
+        if item[-2:] != "}," or item[0] != "{":
+            raise ValueError("malformatted line: {0}".format(item))
+        mac, data = item[1:-2].split(',',1)
+
+        # the first part must be a valid MAC
+        mac = AlfredParser._parse_string(mac.strip())
+        AlfredParser.validate(mac, 'MAC_SCHEMA')
+
+        budget.check_line(item)
+        return mac, AlfredParser._parse_string(data.strip()).encode('latin-1')
+
+    @staticmethod
+    def decode(mac, data, budget):
+        r'''
+        Return the ``data`` sent by ``mac`` as text, decompressing it first
+        if it is compressed.
+        '''
+        if b"\x00" in data:
+            decompress = zlib.decompressobj(zlib.MAX_WBITS|32)
+            # stops after max_bytes of output (protection from zip bombs)
+            data = decompress.decompress(data, budget.max_bytes)
+            if decompress.unconsumed_tail:
+                budget.exceeded(mac, "more than {} bytes of decompressed data".format(budget.max_bytes))
+        data = data.decode('utf-8')
+
+        budget.check_bytes(mac, len(data))
+
+        return data
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data, parse_constant = AlfredParser._parse_constant)
+
+    @staticmethod
+    def parse_line(item, nodes = {}, links = {}, budget = None):
+        r'''
+        Parse and validate a line as returned by alfred (see
+        :meth:`split_line` and :meth:`parse_data`).
+        '''
+        if budget is None:
+            budget = Budget()
+        start = time.monotonic()
+
+        mac, data = AlfredParser.split_line(item, budget)
+        AlfredParser.parse_data(mac, data, nodes, links, budget, start)
+
+    @staticmethod
+    def parse_data(mac, data, nodes = {}, links = {}, budget = None, start = None):
+        r'''
+        Parse and validate the map data (type 64) sent by ``mac``, which must
+        conform to ``ALFRED_NODE_SCHEMA``. Note that most missing fields are
+        populated with reasonable defaults.
+
+        Raises :class:`BudgetExceeded` if the node's data exceeds a limit of
+        ``budget`` (the default limits if not given); the node is left
+        untouched then.
+        '''
+        if budget is None:
+            budget = Budget()
+        if start is None:
+            start = time.monotonic()
+
+        data = AlfredParser.decode(mac, data, budget)
+        budget.check_time(mac, start)
+        properties = AlfredParser.loads(data)
+
+        # check before validating since validation time grows with the links
+        if isinstance(properties, dict) and isinstance(properties.get('links', None), list):
+            budget.check_links(mac, properties['links'])
+
+        budget.check_time(mac, start)
+        AlfredParser.validate(properties, 'ALFRED_NODE_SCHEMA')
+
+        # set some defaults for unspecified fields
+        #properties.setdefault('name', mac)
+        if 'geo' in properties:
+            geo = properties['geo'].split()
+            properties['geo'] = [ float(geo[0]), float(geo[1]) ]
+            properties['latitude'] = float(geo[0])
+            properties['longitude'] = float(geo[1])
+
+        properties.setdefault('gateway', False)
+        properties.setdefault('vpn', False)
+        properties.setdefault('links', [])
+        node_links = properties['links']
+        del properties['links']
+
+        budget.check_interfaces(mac, node_links)
+        budget.check_time(mac, start)
+        budget.charge(mac, len(data), node_links)
+
+        if mac in nodes:
+            # update existing node
+            node = nodes[mac]
+            node.update_properties(properties, True)
+            node.online = True
+            node.lastseen = core.now_timestamp
+        else:
+            # create a new Node
+            node = Node(mac, properties, True)
+            nodes[mac] = node
+
+        # forget the interface MACs the node does not report anymore, so
+        # that nodes reporting new ones every run do not pile them up
+        interfaces = set(node_link['smac'] for node_link in node_links)
+        for smac in node.interfaces - interfaces:
+            if smac != mac and nodes.get(smac, None) is node:
+                del nodes[smac]
+        node.interfaces = interfaces
+
+        # add links and connect source mac to node
+        for node_link in node_links:
+            smac = node_link['smac']
+            dmac = node_link['dmac']
+            quality = node_link.get('qual', 0.)
+            nodes[smac] = node
+            links[(smac, dmac)] = Link(node, smac, dmac, quality)
+
+    @staticmethod
+    def parse_service(mac, data, budget = None):
+        r'''
+        Parse and validate a service (type 91) announced by ``mac``, which
+        must conform to ``SERVICE_SCHEMA``. Returns the ``link`` and
+        ``label`` of the service.
+        '''
+        if budget is None:
+            budget = Budget()
+
+        data = AlfredParser.decode(mac, data, budget)
+        service = AlfredParser.loads(data)
+        AlfredParser.validate(service, 'SERVICE_SCHEMA')
+        budget.charge(mac, len(data), [])
+        return { 'mac': mac, 'link': service['link'], 'label': service['label'] }
+
+def loadAliases(path):
+    with open(path, 'r') as file:
+        aliases = json.loads(file.read(), parse_constant = AlfredParser._parse_constant)
+        AlfredParser.validate(aliases, 'ALIASES_SCHEMA')
+        return aliases
+
+def applyAliases(nodes, aliases):
+    for mac, properties in aliases.items():
+        node = nodes.get(mac, None);
+        if node:
+            force = properties.get("force", False)
+            node.update_properties(properties, force)
+
+class AliasCache:
+    r'''
+    The aliases of a file, which is only read again when its mtime or size
+    changed and only validated again when its content changed.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.stat = None
+        self.digest = None
+        self.aliases = {}
+
+    def load(self):
+        r'''
+        Return the current aliases and the set of MACs whose alias changed
+        since the last call.
+        '''
+        import hashlib
+
+        if not isFile(self.path):
+            changed = set(self.aliases)
+            self.stat = self.digest = None
+            self.aliases = {}
+            return self.aliases, changed
+
+        stat = os.stat(self.path)
+        stat = (stat.st_mtime_ns, stat.st_size)
+        if stat == self.stat:
+            return self.aliases, set()
+
+        with open(self.path, 'rb') as file:
+            content = file.read()
+
+        digest = hashlib.sha1(content).digest()
+        if digest == self.digest:
+            self.stat = stat
+            return self.aliases, set()
+
+        # only remembered once valid, so that invalid aliases are read
+        # (and reported) again instead of being taken as unchanged
+        aliases = json.loads(content.decode('utf-8'), parse_constant = AlfredParser._parse_constant)
+        AlfredParser.validate(aliases, 'ALIASES_SCHEMA')
+
+        changed = set()
+        for mac in set(aliases) | set(self.aliases):
+            if aliases.get(mac, None) != self.aliases.get(mac, None):
+                changed.add(mac)
+
+        self.aliases = aliases
+        self.stat = stat
+        self.digest = digest
+        return aliases, changed
+
+def parseMaps(path, nodes, links, budget = None):
+    if budget is None:
+        budget = Budget()
+
+    limit = budget.max_line() + 1
+    with open(path, 'r') as maps:
+        while True:
+            line = maps.readline(limit)
+            if not line:
+                break
+
+            try:
+                if len(line) == limit and not line.endswith('\n'):
+                    # do not read the rest of overlong lines into memory
+                    rest = line
+                    while rest and not rest.endswith('\n'):
+                        rest = maps.readline(limit)
+                    budget.check_line(line)
+
+                AlfredParser.parse_line(line.strip(), nodes, links, budget)
+            except BudgetExceeded:
+                continue
+            except:
+                import traceback
+                traceback.print_exc()
+                continue
+
+def parseData(entries, nodes, links, budget = None):
+    r'''
+    Parse the map data ``entries`` (``(mac, data)`` as read from the alfred
+    socket, see :func:`mapbackend.alfred.request`) into ``nodes`` and
+    ``links``.
+    '''
+    if budget is None:
+        budget = Budget()
+
+    for mac, data in entries:
+        try:
+            AlfredParser.validate(mac, 'MAC_SCHEMA')
+            AlfredParser.parse_data(mac, data, nodes, links, budget)
+        except BudgetExceeded:
+            continue
+        except:
+            import traceback
+            traceback.print_exc()
+            continue
+
+def parseServices(entries, budget = None):
+    r'''
+    Return the services announced in ``entries`` (``(mac, data)`` as read
+    from the alfred socket or the lines of ``alfred -r 91``), sorted by MAC.
+    '''
+    if budget is None:
+        budget = Budget()
+
+    services = []
+    for entry in entries:
+        try:
+            if isinstance(entry, str):
+                entry = AlfredParser.split_line(entry.strip(), budget)
+            services.append(AlfredParser.parse_service(*entry, budget))
+        except BudgetExceeded:
+            continue
+        except:
+            import traceback
+            traceback.print_exc()
+            continue
+    return sorted(services, key = lambda service: (service['mac'], service['link']))
+
+def linkReverse(links):
+    # find reverse node for each link
+    for link in links.values():
+        if link.reverse:
+            continue
+
+        reverse = links.get((link.dmac, link.smac), None)
+        if not reverse:
+            # commented because of too many error messages
+            #sys.stderr.write("Link {0} -> {1} has only been reported by one of its ends.\n".format(link.smac,link.dmac))
+            continue
+
+        link.reverse = reverse
+        link.reverse.reverse = link
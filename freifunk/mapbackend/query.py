@@ -0,0 +1,374 @@
+r'''
+Answer HTTP queries about the nodes (``--serve``).
+'''
+
+import os
+import re
+import math
+
+from . import core
+from .core import Node, Link
+from .meshviewer import meshviewer_org_node, meshviewer_org_link
+
+class QueryIndex:
+    r'''
+    In-memory indexes over ``nodes`` and ``links`` to answer the queries of
+    :class:`QueryServer` without scanning all nodes.
+
+    Nodes are indexed by all of their MACs and their node id, by their
+    lower case name (sorted, for prefix searches), by position (in a grid
+    of ``CELL`` degrees) and by community. The bidirectional links of each
+    node are kept to answer neighbourhood queries.
+    '''
+    CELL = 0.1
+
+    def __init__(self, nodes, links):
+        self.timestamp = core.now_timestamp
+        self.by_mac = dict(nodes)
+        self.nodes = []
+        self.grid = {}
+        self.communities = {}
+        self.neighbours = {}
+
+        names = []
+        for node in set(nodes.values()):
+            self.nodes.append(node)
+            self.by_mac[re.sub('[:]', '', node.mac)] = node
+            names.append((str(node.properties.get('name', node.mac)).lower(), node.mac))
+
+            if node.has_location():
+                self.grid.setdefault(self.cell(node.properties['latitude'], node.properties['longitude']), []).append(node)
+
+            community = node.properties.get('community', '')
+            stats = self.communities.setdefault(community, {
+                'nodes': 0, 'online': 0, 'clients': 0, 'gateways': 0, 'vpn': 0
+            })
+            stats['nodes'] += 1
+            if node.online:
+                stats['online'] += 1
+                stats['clients'] += node.properties.get('clientcount', 0)
+            if node.properties.get('gateway', False):
+                stats['gateways'] += 1
+            if node.properties.get('vpn', False):
+                stats['vpn'] += 1
+
+        names.sort()
+        self.names = [name for name, mac in names]
+        self.name_macs = [mac for name, mac in names]
+
+        for link in links.values():
+            if link.reverse:
+                self.neighbours.setdefault(link.source.mac, []).append(link)
+
+    @classmethod
+    def cell(cls, latitude, longitude):
+        return (int(latitude // cls.CELL), int(longitude // cls.CELL))
+
+    def node(self, key):
+        r'''
+        Return the node with MAC or node id ``key`` or ``None``.
+        '''
+        return self.by_mac.get(key.lower(), None)
+
+    def by_name(self, prefix):
+        r'''
+        Return all nodes whose name starts with ``prefix`` (ignoring case).
+        '''
+        import bisect
+
+        prefix = prefix.lower()
+        i = bisect.bisect_left(self.names, prefix)
+        result = []
+        while i < len(self.names) and self.names[i].startswith(prefix):
+            result.append(self.by_mac[self.name_macs[i]])
+            i += 1
+        return result
+
+    def by_bbox(self, south, west, north, east):
+        r'''
+        Return all nodes with a position inside of the given bounding box.
+        '''
+        low = self.cell(south, west)
+        high = self.cell(north, east)
+        cells = (high[0] - low[0] + 1) * (high[1] - low[1] + 1)
+
+        if cells > len(self.grid):
+            candidates = (node for nodes in self.grid.values() for node in nodes)
+        else:
+            candidates = (node
+                for x in range(low[0], high[0] + 1)
+                for y in range(low[1], high[1] + 1)
+                for node in self.grid.get((x, y), []))
+
+        result = []
+        for node in candidates:
+            latitude = node.properties['latitude']
+            longitude = node.properties['longitude']
+            if south <= latitude <= north and west <= longitude <= east:
+                result.append(node)
+        return result
+
+def snapshot(nodes, links):
+    r'''
+    Return copies of ``nodes`` and ``links`` for a :class:`QueryIndex` that
+    is served while the next run already changes the originals (in
+    ``--watch`` mode, which runs in another thread): the nodes, their
+    properties and online state and the links are copied.
+    '''
+    import copy
+
+    copies = {}
+    for node in set(nodes.values()):
+        clone = Node.__new__(Node)
+        clone.__dict__.update(node.__dict__)
+        clone.__dict__['properties'] = dict(node.properties)
+        if node.state is not None:
+            state = copy.copy(node.state)
+            state.flaps = list(state.flaps)
+            state.transitions = list(state.transitions)
+            clone.__dict__['state'] = state
+        copies[node] = clone
+
+    link_copies = {}
+    for key, link in links.items():
+        if link.reverse:
+            link_copies[key] = Link(copies[link.source], link.smac, link.dmac, link.quality)
+    for key, link in link_copies.items():
+        link.reverse = link_copies.get((link.dmac, link.smac), None)
+
+    return { mac: copies[node] for mac, node in nodes.items() }, link_copies
+
+class QueryServer:
+    r'''
+    A minimal asynchronous HTTP/1.1 server answering queries about the
+    nodes of the current :class:`QueryIndex`.
+
+    Supported requests (all ``GET``, answered with JSON)::
+
+        /api/nodes/<mac or node id>
+        /api/nodes/<mac or node id>/neighbours
+        /api/nodes?name=<prefix>&community=<community>&online=1&limit=100
+        /api/nodes?bbox=<south>,<west>,<north>,<east>&community=...
+        /api/communities
+        /api/communities/<community>
+
+    Nodes are rendered like in the meshviewer.json. Responses are cached
+    until the index is replaced on the next data refresh.
+    '''
+    MAX_CACHE = 4096
+    MAX_LIMIT = 1000
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+        self._index = None
+        self.cache = {}
+
+    @property
+    def index(self):
+        return self._index
+
+    @index.setter
+    def index(self, index):
+        self._index = index
+        self.cache = {}
+
+    async def start(self, host, port):
+        import asyncio
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    method, target, version = line.decode('latin-1').split()
+                except ValueError:
+                    writer.write(self.response(400, b'', False))
+                    break
+
+                keep_alive = (version == 'HTTP/1.1')
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'connection':
+                        token = value.strip().lower()
+                        if token == 'close':
+                            keep_alive = False
+                        elif token == 'keep-alive':
+                            keep_alive = True
+
+                status, body = self.query(method, target)
+                if method == 'HEAD':
+                    writer.write(self.response(status, b'', keep_alive, len(body)))
+                else:
+                    writer.write(self.response(status, body, keep_alive))
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    REASONS = { 200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable' }
+
+    def response(self, status, body, keep_alive, length = None):
+        return 'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+            status, self.REASONS[status], len(body) if length is None else length, 'keep-alive' if keep_alive else 'close'
+        ).encode('latin-1') + body
+
+    def query(self, method, target):
+        r'''
+        Return the status and the body of the response to ``target``.
+        '''
+        if method not in ('GET', 'HEAD'):
+            return 405, b''
+
+        if self.index is None:
+            return 503, b''
+
+        cached = self.cache.get(target, None)
+        if cached:
+            return cached
+
+        try:
+            status, obj = self.route(target)
+        except (ValueError, KeyError, ArithmeticError):
+            status, obj = 400, { 'error': 'invalid query' }
+
+        result = (status, self.serializer.dumps(obj))
+        if len(self.cache) >= self.MAX_CACHE:
+            self.cache = {}
+        self.cache[target] = result
+        return result
+
+    def route(self, target):
+        from urllib.parse import urlsplit, parse_qs, unquote
+
+        url = urlsplit(target)
+        path = [unquote(p) for p in url.path.split('/') if p]
+        query = { key: values[-1] for key, values in parse_qs(url.query).items() }
+        index = self.index
+
+        if path[:2] == ['api', 'nodes']:
+            if len(path) == 2:
+                return 200, self.find(query)
+
+            node = index.node(path[2])
+            if not node:
+                return 404, { 'error': 'unknown node' }
+
+            if len(path) == 3:
+                return 200, meshviewer_org_node(node)
+
+            if len(path) == 4 and path[3] == 'neighbours':
+                neighbours = []
+                for link in index.neighbours.get(node.mac, []):
+                    neighbours.append({
+                        'node': meshviewer_org_node(link.reverse.source),
+                        'link': meshviewer_org_link(link)
+                    })
+                return 200, { 'node': meshviewer_org_node(node), 'neighbours': neighbours }
+
+        if path == ['api', 'communities']:
+            return 200, { 'timestamp': index.timestamp.isoformat(), 'communities': index.communities }
+
+        if len(path) == 3 and path[:2] == ['api', 'communities']:
+            if path[2] not in index.communities:
+                return 404, { 'error': 'unknown community' }
+            return 200, index.communities[path[2]]
+
+        return 404, { 'error': 'unknown request' }
+
+    def find(self, query):
+        index = self.index
+
+        if 'bbox' in query:
+            south, west, north, east = [float(x) for x in query['bbox'].split(',')]
+            if not all(math.isfinite(x) for x in (south, west, north, east)):
+                raise ValueError('invalid bbox')
+            # huge values would overflow the grid cells
+            south, north = [min(max(x, -90.0), 90.0) for x in (south, north)]
+            west, east = [min(max(x, -180.0), 180.0) for x in (west, east)]
+            nodes = index.by_bbox(south, west, north, east)
+        elif 'name' in query:
+            nodes = index.by_name(query['name'])
+        else:
+            nodes = index.nodes
+
+        if 'community' in query:
+            nodes = [node for node in nodes if node.properties.get('community', '') == query['community']]
+
+        if 'online' in query:
+            online = query['online'] not in ('0', 'false')
+            nodes = [node for node in nodes if node.online == online]
+
+        limit = max(0, min(int(query.get('limit', self.MAX_LIMIT)), self.MAX_LIMIT))
+
+        return {
+            'timestamp': index.timestamp.isoformat(),
+            'count': len(nodes),
+            'nodes': [meshviewer_org_node(node) for node in nodes[:limit]]
+        }
+
+def serve(args):
+    r'''
+    Keep running: call :func:`update` whenever the alfred data has changed
+    (every ``args.refresh`` seconds if it is read from ``args.socket``) or
+    run :func:`watch` if ``args.watch`` is set, and answer queries about the
+    result via a :class:`QueryServer`.
+    '''
+    import asyncio, traceback
+    from .cli import update
+    from .serializer import JsonSerializer
+    from .watch import watch
+
+    host, _, port = args.serve.rpartition(':')
+    host = host.strip('[]') or None
+    server = QueryServer(JsonSerializer(args.pretty, args.json_backend))
+
+    def refresh():
+        nodes, links = update(args)
+        return QueryIndex(nodes, links)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        await server.start(host, int(port))
+
+        if args.watch:
+            def publish(nodes, links):
+                # the nodes are changed by the next run while this index
+                # is served
+                index = QueryIndex(*snapshot(nodes, links))
+                loop.call_soon_threadsafe(setattr, server, 'index', index)
+
+            await loop.run_in_executor(None, watch, args, publish)
+            return
+
+        mtime = None
+        while True:
+            if args.socket:
+                # alfred does not tell when its data changed
+                current = loop.time()
+            else:
+                try:
+                    current = os.stat(args.maps).st_mtime
+                except OSError:
+                    current = None
+
+            if current is not None and current != mtime:
+                mtime = current
+                try:
+                    server.index = await loop.run_in_executor(None, refresh)
+                except Exception:
+                    traceback.print_exc()
+
+            await asyncio.sleep(args.refresh)
+
+    asyncio.run(run())
@@ -0,0 +1,124 @@
+r'''
+Render a search index over the nodes for meshviewer.
+'''
+
+import re
+import os
+import json
+
+from .core import isFile, foldText
+
+class SearchIndex:
+    r'''
+    A search index over the names, node ids and contacts of the nodes for
+    meshviewer, written to ``directory`` in shards that clients fetch on
+    demand.
+
+    Searched texts are normalized (see :meth:`normalize`) and split into
+    tokens; a token is stored in the shard named after its first ``SHARD``
+    characters, ``<directory>/<shard>.json``, which maps each token of the
+    shard to the matching nodes as ``[node_id, name, latitude, longitude]``.
+    A client normalizes the query, fetches the shard of its first characters
+    and picks the tokens starting with the query. ``index.json`` lists the
+    shards with their number of entries.
+
+    The tokens of a node are kept with the node (``Node.search``) and only
+    computed again when its name, contact or position changed, and only the
+    shards such nodes (or removed nodes) belong to are rendered and written
+    again.
+    '''
+    SHARD = 2
+
+    def __init__(self, directory, serializer, files):
+        self.directory = directory
+        self.serializer = serializer
+        self.files = files
+        self.changed = set()
+
+    @staticmethod
+    def normalize(text):
+        r'''
+        Return ``text`` in lower case, without accents and with all
+        characters other than letters and digits replaced by spaces.
+        '''
+        return re.sub('[^a-z0-9]+', ' ', foldText(text)).strip()
+
+    def tokens(self, node):
+        r'''
+        Return the tokens and the entry of ``node``.
+        '''
+        properties = node.properties
+        name = properties.get('name', node.mac)
+        contact = properties.get('contact', '')
+        latitude = properties.get('latitude', None)
+        longitude = properties.get('longitude', None)
+        if latitude is None or longitude is None:
+            latitude = longitude = None
+
+        key = (name, contact, latitude, longitude)
+        cached = node.search
+        if cached and cached[0] == key:
+            return cached[1], cached[2]
+
+        node_id = re.sub('[:]', '', node.mac)
+        tokens = set([node_id])
+        words = self.normalize(name).split()
+        tokens.update(words)
+        tokens.add(''.join(words))
+        if contact:
+            tokens.update(self.normalize(contact.split('@', 1)[0]).split())
+            tokens.add(''.join(self.normalize(contact).split()))
+        tokens = sorted(token for token in tokens if len(token) >= self.SHARD)
+
+        entry = [node_id, name, latitude, longitude]
+        if cached:
+            self.changed.update(token[:self.SHARD] for token in cached[1])
+        self.changed.update(token[:self.SHARD] for token in tokens)
+        node.search = (key, tokens, entry)
+        return tokens, entry
+
+    def write(self, nodes):
+        r'''
+        Update the shards of the index in ``directory`` for ``nodes``.
+        '''
+        os.makedirs(self.directory, exist_ok=True)
+        index_path = os.path.join(self.directory, 'index.json')
+        previous = {}
+        if isFile(index_path):
+            with open(index_path, 'rb') as file:
+                previous = json.loads(file.read().decode('utf-8')).get('shards', {})
+
+        unique = [self.tokens(node) for node in set(nodes.values())]
+
+        counts = {}
+        for tokens, entry in unique:
+            for token in tokens:
+                shard = token[:self.SHARD]
+                counts[shard] = counts.get(shard, 0) + 1
+
+        # nodes that were removed show up in the counts
+        dirty = set()
+        for shard in set(counts) | set(previous):
+            path = os.path.join(self.directory, '{}.json'.format(shard))
+            if shard not in counts:
+                if isFile(path):
+                    os.remove(path)
+            elif shard in self.changed or counts[shard] != previous.get(shard, None) or not isFile(path):
+                dirty.add(shard)
+
+        # dirty shard => token => entries
+        shards = {}
+        if dirty:
+            for tokens, entry in unique:
+                for token in tokens:
+                    shard = token[:self.SHARD]
+                    if shard in dirty:
+                        shards.setdefault(shard, {}).setdefault(token, []).append(entry)
+
+        for shard, tokens in shards.items():
+            path = os.path.join(self.directory, '{}.json'.format(shard))
+            self.files.write(path, self.serializer.dumps(dict((token, sorted(tokens[token])) for token in sorted(tokens))))
+
+        self.files.write(index_path, self.serializer.dumps({ 'shard': self.SHARD, 'shards': dict(sorted(counts.items())) }))
+
+        print("Search index: rendered {} of {} shards".format(len(shards), len(counts)))
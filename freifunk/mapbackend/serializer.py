@@ -0,0 +1,191 @@
+r'''
+Serialize the rendered formats to JSON.
+'''
+
+import re
+import time
+import json
+
+# orjson and ujson write floats below 1e-4 and from 1e16 on differently than
+# the json module (e.g. 0.000068 for 6.8e-05, 1e-7 for 1e-07, 1e16 for
+# 1e+16); these find such numbers (and a few strings that look like them)
+SMALL_FLOAT = re.compile(rb'0\.0000(?<=[:,\[\s-]0\.0000)')
+EXPONENT = re.compile(rb'e(?<=[0-9]e)[-+]?[0-9]+[,\]}\s]')
+
+
+class JsonSerializer:
+    r'''
+    Serializes objects to JSON encoded bytes, using the fastest backend
+    available: ``orjson``, ``ujson`` or the ``json`` module of the standard
+    library.
+
+    The output of the ``json`` module is the reference: compact output is
+    UTF-8 without any whitespace (``separators=(',', ':')`` and
+    ``ensure_ascii=False``; the fast backends can write neither the spaces
+    nor the escaped characters of ``json.dumps`` with its defaults) and
+    pretty output has its keys sorted and indented by two spaces. The fast
+    backends produce the same bytes in compact mode, which
+    benchmark/serializers.py verifies; objects with floats they write
+    differently (see ``EXPONENT``) are written with the ``json`` module.
+    NaN and infinite floats are not valid JSON and are rejected when the
+    data of the nodes is parsed.
+    '''
+    BACKENDS = ('orjson', 'ujson', 'json')
+
+    def __init__(self, pretty = False, backend = None):
+        import importlib
+
+        self.pretty = pretty
+        for name in ([backend] if backend else self.BACKENDS):
+            try:
+                self.module = importlib.import_module(name)
+                self.backend = name
+                break
+            except ImportError:
+                continue
+        else:
+            raise ImportError("JSON backend {} is not available".format(backend))
+
+        self._dumps = getattr(self, '_dumps_' + self.backend)
+
+    def _dumps_orjson(self, obj):
+        if self.pretty:
+            return self.module.dumps(obj, option = self.module.OPT_INDENT_2 | self.module.OPT_SORT_KEYS)
+        return self.module.dumps(obj)
+
+    def _dumps_ujson(self, obj):
+        if self.pretty:
+            return self.module.dumps(obj, ensure_ascii = False, escape_forward_slashes = False, sort_keys = True, indent = 2).encode('utf-8')
+        return self.module.dumps(obj, ensure_ascii = False, escape_forward_slashes = False).encode('utf-8')
+
+    def _dumps_json(self, obj):
+        if self.pretty:
+            return json.dumps(obj, ensure_ascii = False, sort_keys = True, indent = 2, separators = (',', ': ')).encode('utf-8')
+        return json.dumps(obj, ensure_ascii = False, separators = (',', ':')).encode('utf-8')
+
+    def dumps(self, obj):
+        r'''
+        Return ``obj`` encoded as JSON bytes.
+        '''
+        try:
+            data = self._dumps(obj)
+        except (TypeError, OverflowError):
+            # the fast backends do not handle everything (e.g. integers
+            # beyond 64 bit), the standard library does
+            if self.backend == 'json':
+                raise
+            return self._dumps_json(obj)
+
+        if self.backend != 'json' and (SMALL_FLOAT.search(data) or EXPONENT.search(data)):
+            return self._dumps_json(obj)
+        return data
+
+    def dump(self, obj, file):
+        r'''
+        Write ``obj`` encoded as JSON to the binary ``file``.
+        '''
+        file.write(self.dumps(obj))
+
+class Fragments(list):
+    r'''
+    A list of already serialized JSON values.
+    '''
+
+class FragmentCache:
+    r'''
+    Renders nodes and links to serialized JSON and keeps the result
+    (``Node.fragments`` and ``Node.link_fragments``, which are stored with
+    the nodes) to reuse it in later runs as long as the node or link did not
+    change. Fragments of formats (or backends) that were not rendered in a
+    run are dropped (see :meth:`prune`), the others expire together with the
+    node.
+
+    Only compact output can be built from fragments. Nodes that are online
+    are rendered again in every run since their ``lastseen`` changes, so
+    fragments mostly save rendering the links and the offline nodes.
+    '''
+    def __init__(self, serializer):
+        self.serializer = serializer
+        self.reused = 0
+        self.rendered = 0
+        self.seconds = 0.0
+        self.touched = set()
+
+    def node(self, node, format, render):
+        r'''
+        Return ``render(node)`` serialized, where ``render`` renders nodes
+        to ``format``.
+        '''
+        key = (format, self.serializer.backend)
+        self.touched.add((node.mac, key))
+
+        entry = node.fragments.get(key, None)
+        if entry and entry[0] == node.version:
+            self.reused += 1
+            return entry[1]
+
+        start = time.perf_counter()
+        data = self.serializer.dumps(render(node))
+        self.seconds += time.perf_counter() - start
+        self.rendered += 1
+
+        node.fragments[key] = (node.version, data)
+        return data
+
+    def link(self, link, format, render):
+        r'''
+        Return ``render(link)`` serialized, where ``render`` renders links
+        to ``format``.
+        '''
+        key = (format, self.serializer.backend, link.smac, link.dmac)
+        version = link.fragment_key(format)
+        self.touched.add((link.source.mac, key))
+
+        entry = link.source.link_fragments.get(key, None)
+        if entry and entry[0] == version:
+            self.reused += 1
+            return entry[1]
+
+        start = time.perf_counter()
+        data = self.serializer.dumps(render(link))
+        self.seconds += time.perf_counter() - start
+        self.rendered += 1
+
+        link.source.link_fragments[key] = (version, data)
+        return data
+
+    def prune(self, nodes):
+        r'''
+        Forget the fragments of nodes and links which have not been rendered
+        since this cache was created.
+        '''
+        for node in set(nodes.values()):
+            for fragments in (node.fragments, node.link_fragments):
+                if fragments:
+                    for key in list(fragments):
+                        if (node.mac, key) not in self.touched:
+                            del fragments[key]
+
+    def dumps(self, obj):
+        r'''
+        Return ``obj`` as compact JSON, where ``obj`` might contain
+        :class:`Fragments`.
+        '''
+        if isinstance(obj, Fragments):
+            return b'[' + b','.join(obj) + b']'
+        if isinstance(obj, dict):
+            return b'{' + b','.join(self.serializer.dumps(key) + b':' + self.dumps(value) for key, value in obj.items()) + b'}'
+        return self.serializer.dumps(obj)
+
+    def dump(self, obj, file):
+        file.write(self.dumps(obj))
+
+    def report(self):
+        total = self.reused + self.rendered
+        if not total:
+            return
+
+        print("Reused {} of {} fragments ({:.0f}%), rendered {} in {:.1f} ms".format(
+            self.reused, total, 100.0 * self.reused / total, self.rendered, self.seconds * 1000))
+        if self.rendered and self.reused:
+            print("Saved about {:.1f} ms by reusing fragments".format(self.reused * self.seconds / self.rendered * 1000))
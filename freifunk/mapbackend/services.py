@@ -0,0 +1,53 @@
+r'''
+Render the services (e.g. status pages) announced via alfred (type 91),
+joined to the nodes that announced them.
+'''
+
+from . import core
+
+def render_services(nodes, services):
+    r'''
+    Return the ``services`` (see :func:`mapbackend.parser.parseServices`)
+    and the gateways among the ``nodes`` with the services each of them
+    announced.
+
+    Services are matched to nodes by the MAC they were announced from,
+    which is the primary MAC of the node for servers that announce their
+    map data with alfred_announce.py.
+    '''
+    def node_id(node):
+        return node.mac.replace(':', '')
+
+    gateways = {}
+    for node in set(nodes.values()):
+        if node.properties.get('gateway', False):
+            gateways[node.mac] = {
+                'node_id': node_id(node),
+                'name': node.properties.get('name', node.mac),
+                'community': node.properties.get('community', ''),
+                'is_online': node.online,
+                'is_vpn': node.properties.get('vpn', False),
+                'addresses': node.properties.get('addresses', []),
+                'services': []
+            }
+
+    entries = []
+    for service in services:
+        node = nodes.get(service['mac'], None)
+        entry = {
+            'mac': service['mac'],
+            'link': service['link'],
+            'label': service['label'],
+            'node_id': node_id(node) if node else None,
+            'is_online': node.online if node else None
+        }
+        entries.append(entry)
+
+        if node and node.mac in gateways:
+            gateways[node.mac]['services'].append({ 'link': service['link'], 'label': service['label'] })
+
+    return {
+        'timestamp': core.now_timestamp.isoformat(),
+        'services': entries,
+        'gateways': [gateways[mac] for mac in sorted(gateways)]
+    }
@@ -0,0 +1,77 @@
+r'''
+Render statistics of the nodes.
+'''
+
+from . import core
+
+def render_stats(nodes, links, fragments = None):
+    r'''
+    Return statistics of the nodes: totals per community, histograms of
+    firmware, model, autoupdater branch and community and percentiles of
+    the load, memory and rootfs usage. Histograms and percentiles are over
+    the nodes that are online. The overall totals also count the flapping
+    nodes (see :class:`mapbackend.online.OnlineTracker`).
+    '''
+    for node in nodes.values():
+        node.done = False
+
+    totals = { 'nodes': 0, 'online': 0, 'clients': 0, 'gateways': 0, 'vpn': 0, 'flapping': 0 }
+    communities = {}
+    histograms = { 'firmware_base': {}, 'firmware_release': {}, 'model': {}, 'autoupdater': {}, 'community': {} }
+    samples = { 'loadavg': [], 'memory_usage': [], 'rootfs_usage': [] }
+
+    def count(histogram, key):
+        histogram[key] = histogram.get(key, 0) + 1
+
+    for node in nodes.values():
+        if node.done:
+            continue
+        node.done = True
+
+        properties = node.properties
+        community = properties.get('community', '')
+        community_totals = communities.setdefault(community, { 'nodes': 0, 'online': 0, 'clients': 0, 'gateways': 0 })
+        totals['nodes'] += 1
+        community_totals['nodes'] += 1
+        if node.state is not None and node.state.flapping():
+            totals['flapping'] += 1
+
+        if not node.online:
+            continue
+
+        clientcount = properties.get('clientcount', 0)
+        totals['online'] += 1
+        totals['clients'] += clientcount
+        community_totals['online'] += 1
+        community_totals['clients'] += clientcount
+        if properties['gateway']:
+            totals['gateways'] += 1
+            community_totals['gateways'] += 1
+        if properties['vpn']:
+            totals['vpn'] += 1
+
+        base, release = node.firmware_parts()
+        count(histograms['firmware_base'], base)
+        count(histograms['firmware_release'], release)
+        count(histograms['model'], properties.get('model', ''))
+        count(histograms['autoupdater'], properties.get('autoupdater', '') or 'disabled')
+        count(histograms['community'], community)
+
+        for key, values in samples.items():
+            if key in properties:
+                values.append(properties[key])
+
+    def percentiles(values):
+        if not values:
+            return {}
+        values.sort()
+        # nearest rank
+        return dict(('p{}'.format(p), values[max(0, -(-p * len(values) // 100) - 1)]) for p in (10, 25, 50, 75, 90, 99, 100))
+
+    return {
+        'timestamp': core.now_timestamp.isoformat(),
+        'totals': totals,
+        'communities': dict(sorted(communities.items())),
+        'histograms': dict((name, dict(sorted(histogram.items()))) for name, histogram in histograms.items()),
+        'percentiles': dict((key, percentiles(values)) for key, values in samples.items())
+    }
@@ -0,0 +1,60 @@
+r'''
+Store the nodes between runs (to remember e.g. when they were last seen).
+'''
+
+import pickle
+
+from . import core
+
+class Unpickler(pickle.Unpickler):
+    r'''
+    Also loads the nodes stored when map-backend.py was a single script (its
+    classes were stored as ``__main__.Node`` and ``__main__.Link``).
+    '''
+    def find_class(self, module, name):
+        if module in ('__main__', 'map_backend') and name in ('Node', 'Link'):
+            return getattr(core, name)
+        return pickle.Unpickler.find_class(self, module, name)
+
+def loadNodes(path, tracker = None):
+    r'''
+    Return the nodes stored in ``path``. The state of the
+    :class:`mapbackend.online.OnlineTracker` ``tracker`` is restored, too,
+    if it was stored after them.
+    '''
+    nodes = {}
+    with open(path, 'rb') as f:
+        unpickler = Unpickler(f)
+        nodes = unpickler.load()
+        if tracker is not None:
+            try:
+                tracker.__dict__.update(unpickler.load().__dict__)
+            except EOFError:
+                # stored without a tracker
+                pass
+
+    # stored before the nodes kept their interface MACs
+    for key, node in nodes.items():
+        if key != node.mac:
+            node.interfaces.add(key)
+
+    resetNodes(nodes)
+
+    return nodes
+
+def resetNodes(nodes):
+    for node in nodes.values():
+        #reset old properties
+        node.online = False
+        node.index = None
+        node.clientcount = 0
+
+def saveNodes(path, nodes, tracker = None):
+    r'''
+    Store the ``nodes`` and, after them (so that they can be loaded without
+    it), the ``tracker`` in ``path``.
+    '''
+    with open(path, 'wb') as f:
+        pickle.dump(nodes, f)
+        if tracker is not None:
+            pickle.dump(tracker, f)
@@ -0,0 +1,208 @@
+r'''
+Render the outputs again whenever the input changes (``--watch``).
+'''
+
+import os
+import sys
+import time
+import traceback
+
+from . import core
+from .core import isFile
+
+class Watcher:
+    r'''
+    Wait for changes of some files.
+
+    Uses inotify (on the directories of the files, so that files which are
+    replaced are noticed as well) and falls back to polling their mtime where
+    inotify is not available. Changes are debounced: :meth:`wait` only
+    returns once no further change was seen for ``debounce`` seconds.
+    '''
+    IN_CLOSE_WRITE = 0x08
+    IN_MOVED_TO = 0x80
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, paths, debounce):
+        self.paths = set(os.path.abspath(path) for path in paths)
+        self.debounce = debounce
+        self.fd = None
+        self.directories = {}
+
+        try:
+            import ctypes, ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+            for directory in set(os.path.dirname(path) for path in self.paths):
+                wd = libc.inotify_add_watch(fd, directory.encode(), self.IN_CLOSE_WRITE | self.IN_MOVED_TO)
+                if wd < 0:
+                    os.close(fd)
+                    raise OSError(ctypes.get_errno(), 'inotify_add_watch failed for {}'.format(directory))
+                self.directories[wd] = directory
+            self.fd = fd
+        except (OSError, AttributeError):
+            sys.stderr.write("inotify not available, polling for changes\n")
+            self.stats = { path: self.stat(path) for path in self.paths }
+
+    @staticmethod
+    def stat(path):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def poll(self, timeout):
+        r'''
+        Return the set of changed paths, waiting at most ``timeout`` seconds
+        (forever if ``None``). The set might be empty.
+        '''
+        import select, struct
+
+        if self.fd is None:
+            time.sleep(self.POLL_INTERVAL if timeout is None else min(timeout, self.POLL_INTERVAL))
+            changed = set()
+            for path in self.paths:
+                stat = self.stat(path)
+                if stat != self.stats[path]:
+                    self.stats[path] = stat
+                    changed.add(path)
+            return changed
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed = set()
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = struct.unpack_from('iIII', data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b'\0').decode('utf-8', 'replace')
+            path = os.path.join(self.directories.get(wd, ''), name)
+            if path in self.paths:
+                changed.add(path)
+            offset += 16 + length
+        return changed
+
+    def wait(self, timeout = None):
+        r'''
+        Block until some of the files changed and return the set of their
+        (absolute) paths. Returns an empty set if nothing changed within
+        ``timeout`` seconds (if given).
+        '''
+        changed = set()
+        deadline = None
+        limit = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if deadline is not None:
+                remaining = max(0, deadline - time.monotonic())
+            elif limit is not None:
+                remaining = max(0, limit - time.monotonic())
+            else:
+                remaining = None
+            paths = self.poll(remaining)
+            if paths:
+                changed |= paths
+                deadline = time.monotonic() + self.debounce
+            elif deadline is not None and time.monotonic() >= deadline:
+                return changed
+            elif deadline is None and limit is not None and time.monotonic() >= limit:
+                return changed
+
+def watch(args, callback = None):
+    r'''
+    Keep running: render the outputs once and then again whenever the alfred
+    data or the aliases change. ``callback`` is called with the ``nodes``
+    and ``links`` after each render.
+
+    The alfred data is either read from the socket ``args.socket`` every
+    ``args.refresh`` seconds or else the file ``args.maps``, which is
+    watched.
+
+    The nodes are kept in memory between renders. If only the aliases
+    changed, only the nodes whose alias changed are recomputed: they get
+    back the properties they reported via alfred and their new alias
+    applied (for nodes that are currently offline, aliases can only be
+    applied on top of their last properties).
+
+    Errors are reported and do not end the loop: invalid aliases are
+    ignored in favour of the last valid ones and after a failed render the
+    alfred data is read again on the next change.
+    '''
+    from .cli import readAlfred, mergeMaps, writeOutputs
+    from .parser import AliasCache
+    from .storage import loadNodes, resetNodes
+    from .online import OnlineTracker
+
+    maps_path = os.path.abspath(args.maps) if args.maps and not args.socket else None
+    paths = []
+    if maps_path:
+        paths.append(maps_path)
+    if args.aliases:
+        paths.append(args.aliases)
+
+    watcher = Watcher(paths, args.debounce)
+    aliases = AliasCache(args.aliases)
+
+    # mac => node
+    nodes = {}
+    tracker = OnlineTracker()
+    if isFile(args.storage):
+        nodes = loadNodes(args.storage, tracker)
+
+    links = {}
+    data = None
+
+    # primary mac => properties as reported via alfred (before aliases)
+    reported = {}
+
+    def loadAliases():
+        try:
+            return aliases.load()
+        except Exception as e:
+            sys.stderr.write("Invalid aliases {}, keeping the last valid ones: {}\n".format(args.aliases, e))
+            return aliases.aliases, set()
+
+    # None: read the alfred data
+    changed = None
+    while True:
+        core.updateTimestamp()
+
+        try:
+            if changed is None or maps_path in changed:
+                resetNodes(nodes)
+                reported = {}
+                data = readAlfred(args)
+                links = mergeMaps(args, nodes, loadAliases()[0], reported, data, tracker)
+            else:
+                current, changed_macs = loadAliases()
+                for mac in changed_macs:
+                    node = nodes.get(mac, None)
+                    if not node:
+                        continue
+                    if node.mac in reported:
+                        node.properties = dict(reported[node.mac])
+                    if mac in current:
+                        node.update_properties(current[mac], current[mac].get("force", False))
+                print("Aliases changed for {} nodes".format(len(changed_macs)))
+
+            writeOutputs(args, nodes, links, data, tracker)
+
+            if callback:
+                callback(nodes, links)
+            failed = False
+        except Exception:
+            traceback.print_exc()
+            failed = True
+
+        if args.socket:
+            # nothing to watch but the aliases, poll alfred
+            changed = watcher.wait(args.refresh) or None
+        else:
+            changed = watcher.wait()
+        if failed:
+            changed = None
@@ -0,0 +1,258 @@
+r'''
+Render DNS records for the nodes: a zone file and incremental changes to it
+in the format of ``nsupdate``.
+'''
+
+import re
+import ipaddress
+
+from . import core
+from .core import isFile, foldText
+
+class Zone:
+    r'''
+    AAAA records for the nodes in the zone ``origin`` (e.g. ``nodes.ffbi``),
+    written to the zone file ``path``.
+
+    Every node with a name and global or unique local addresses (reported in
+    ``addresses``) gets the records ``<label>.<origin>``, where ``label`` is
+    its name normalized to a host name (see :meth:`label`). If the names of
+    several nodes map to the same label, each of them gets its MAC appended
+    to it instead. The label and addresses of a node are kept with the node
+    (see :meth:`host`).
+
+    The names come from the nodes, so ``origin`` should be a zone of its own
+    that is delegated to the nodes (``nodes.ffbi`` rather than ``ffbi``).
+    Labels in ``RESERVED`` and labels that the template defines are never
+    given to nodes, nor changed by the ``nsupdate`` commands.
+
+    The zone file consists of the file ``template`` (SOA, NS and static
+    records; ``{serial}``, ``{origin}``, ``{ttl}`` and ``{nameserver}``, by
+    default ``ns.`` followed by the parent domain of ``origin``, are
+    replaced) followed by the records of the nodes. The serial
+    (``YYYYMMDDnn``) is only increased and the file only written when its
+    content changes, so unchanged runs do not touch it.
+
+    If ``changes`` is given, the records that changed are appended to this
+    file as ``nsupdate`` commands (replacing the whole set of records of a
+    label), to be sent to the primary server of the zone with ``nsupdate -k
+    <key> <changes>`` and removed once they were sent. The primary should
+    only accept updates of ``origin`` that are signed with that TSIG key
+    (e.g. ``update-policy { grant <key> zonesub AAAA; };`` in BIND).
+    '''
+    TTL = 300
+
+    # labels whose records are replaced in one nsupdate message (which must
+    # not exceed 64 KiB)
+    CHUNK = 200
+
+    TEMPLATE = '''$ORIGIN {origin}.
+$TTL {ttl}
+@ IN SOA {nameserver}. hostmaster.{origin}. ( {serial} 3600 900 604800 {ttl} )
+@ IN NS {nameserver}.
+'''
+
+    # labels of infrastructure that nodes must not take over
+    RESERVED = frozenset(['ns', 'ns1', 'ns2', 'dns', 'www', 'map', 'mail', 'smtp', 'imap', 'status',
+        'localhost', 'hostmaster', 'wpad', 'isatap', 'autoconfig', 'autodiscover'])
+
+    HEADER = '; generated by map-backend.py, serial {serial}\n'
+    NODES = '; nodes\n'
+
+    def __init__(self, origin, path, template = None, changes = None, server = None):
+        self.origin = origin.strip('.')
+        self.path = path
+        self.template = Zone.TEMPLATE
+        if template:
+            with open(template, 'r') as file:
+                self.template = file.read()
+        self.changes = changes
+        self.server = server
+        self.reserved = Zone.RESERVED | self.static()
+
+    def header(self, serial):
+        r'''
+        Return the template with its placeholders replaced.
+        '''
+        parent = self.origin.split('.', 1)[1] if '.' in self.origin else self.origin
+        return (self.template.replace('{origin}', self.origin).replace('{ttl}', str(self.TTL))
+            .replace('{nameserver}', 'ns.' + parent).replace('{serial}', str(serial)).rstrip('\n') + '\n')
+
+    def static(self):
+        r'''
+        Return the labels (directly below ``origin``) that the template
+        defines records for.
+        '''
+        labels = set()
+        suffix = '.' + self.origin + '.'
+        for line in self.header(0).splitlines():
+            if not line or line[0] in ' \t;$':
+                continue
+            name = line.split()[0].lower()
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+            elif name.endswith('.'):
+                continue
+            if name != '@':
+                labels.add(name.split('.')[-1])
+        return labels
+
+    @staticmethod
+    def label(name):
+        r'''
+        Return ``name`` as a host name label (lower case letters, digits and
+        hyphens, at most 63 characters) or ``None`` if nothing is left.
+        '''
+        label = re.sub('[^a-z0-9]+', '-', foldText(name)).strip('-')[:63].strip('-')
+        return label or None
+
+    @staticmethod
+    def addresses(node):
+        r'''
+        Return the sorted addresses of ``node`` that are reachable from the
+        mesh, i.e., without link local, multicast and invalid ones.
+        '''
+        addresses = set()
+        for address in node.properties.get('addresses', None) or []:
+            try:
+                address = ipaddress.IPv6Address(address)
+            except ValueError:
+                continue
+            if address.is_link_local or address.is_multicast or address.is_unspecified or address.is_loopback:
+                continue
+            addresses.add(address.compressed)
+        return sorted(addresses)
+
+    def host(self, node):
+        r'''
+        Return the label and the addresses of ``node``.
+
+        They are kept with the node (``Node.dns``) and only computed again
+        when its name or addresses changed.
+        '''
+        name = node.properties.get('name', None)
+        key = (name, tuple(node.properties.get('addresses', None) or []))
+        cached = node.dns
+        if cached and cached[0] == key:
+            return cached[1], cached[2]
+
+        label = Zone.label(name) if name is not None else None
+        addresses = Zone.addresses(node) if label else []
+        node.dns = (key, label, addresses)
+        return label, addresses
+
+    def records(self, nodes):
+        r'''
+        Return a dictionary label => sorted addresses of the ``nodes``.
+        '''
+        labels = {}
+        for node in set(nodes.values()):
+            label, addresses = self.host(node)
+            if label and addresses:
+                labels.setdefault(label, []).append((node.mac, addresses))
+
+        records = {}
+        for label, entries in labels.items():
+            if label in self.reserved:
+                continue
+            if len(entries) == 1:
+                records[label] = entries[0][1]
+                continue
+            for mac, addresses in entries:
+                suffix = '-' + mac.replace(':', '')
+                records[label[:63 - len(suffix)].rstrip('-') + suffix] = addresses
+        return records
+
+    def load(self):
+        r'''
+        Return the content and the serial of the zone file written last
+        (``None`` and ``0`` if there is none).
+        '''
+        if not isFile(self.path):
+            return None, 0
+
+        with open(self.path, 'rb') as file:
+            content = file.read()
+
+        match = re.match(rb'; generated by map-backend.py, serial (\d+)\n', content)
+        return content, int(match.group(1)) if match else 0
+
+    @staticmethod
+    def parse(content):
+        r'''
+        Return the records of the nodes in the zone file ``content``.
+        '''
+        records = {}
+        lines = iter((content or b'').decode('utf-8').splitlines(True))
+        for line in lines:
+            if line == Zone.NODES:
+                break
+        for line in lines:
+            fields = line.split()
+            if len(fields) == 4 and fields[1:3] == ['IN', 'AAAA']:
+                records.setdefault(fields[0], []).append(fields[3])
+        return records
+
+    def dumps(self, serial, records):
+        r'''
+        Return the zone file with ``serial`` and ``records``.
+        '''
+        lines = [Zone.HEADER.format(serial = serial), self.header(serial), Zone.NODES]
+        for label in sorted(records):
+            for address in records[label]:
+                lines.append('{} IN AAAA {}\n'.format(label, address))
+        return ''.join(lines).encode('utf-8')
+
+    def nsupdate(self, old, new):
+        r'''
+        Return the ``nsupdate`` commands that turn the records ``old`` into
+        ``new``. Reserved and static labels are left alone (even if an older
+        zone file has records of nodes for them).
+        '''
+        changed = sorted(label for label in old.keys() | new.keys()
+            if old.get(label, None) != new.get(label, None) and label not in self.reserved)
+
+        commands = []
+        for i in range(0, len(changed), self.CHUNK):
+            if self.server:
+                commands.append('server {}'.format(self.server))
+            commands.append('zone {}.'.format(self.origin))
+            for label in changed[i:i + self.CHUNK]:
+                name = '{}.{}.'.format(label, self.origin)
+                commands.append('update delete {} AAAA'.format(name))
+                for address in new.get(label, []):
+                    commands.append('update add {} {} AAAA {}'.format(name, self.TTL, address))
+            commands.append('send')
+        return changed, ''.join(command + '\n' for command in commands)
+
+    def serial(self, serial):
+        r'''
+        Return the serial following ``serial``: today's first one or, if that
+        is not larger, ``serial + 1``.
+        '''
+        return max(serial + 1, int(core.now_timestamp.strftime('%Y%m%d')) * 100)
+
+    def write(self, nodes, files):
+        r'''
+        Write the zone file for ``nodes`` (with the
+        :class:`manifest.Manifest` ``files``) and the changes to it, if
+        anything changed.
+        '''
+        content, serial = self.load()
+        new = self.records(nodes)
+
+        if self.dumps(serial, new) == content:
+            files.write(self.path, content)
+            print("DNS zone {}: {} names unchanged (serial {})".format(self.origin, len(new), serial))
+            return False
+
+        serial = self.serial(serial)
+        files.write(self.path, self.dumps(serial, new))
+
+        changed, commands = self.nsupdate(Zone.parse(content), new)
+        if self.changes and changed:
+            with open(self.changes, 'a') as file:
+                file.write(commands)
+
+        print("DNS zone {}: {} names, {} changed (serial {})".format(self.origin, len(new), len(changed), serial))
+        return True
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+'''
+A compact binary snapshot of the nodes written by map-backend.py
+(``--snapshot``) for local tools like counter_update.py.
+
+The snapshot is read via ``mmap``: records have a fixed width and are
+unpacked only when accessed, so opening a snapshot and looking up a node or
+the totals of a community does not depend on the size of the mesh.
+
+Layout (all numbers little endian)::
+
+    header       HEADER
+    nodes        node_count x NODE, sorted by primary MAC
+    index        mac_count x INDEX (any MAC of a node => its record), sorted by MAC
+    communities  community_count x COMMUNITY
+    strings      uint16 length + UTF-8 bytes each; offset 0 is the empty string
+
+Typical call::
+
+    ./snapshot.py /var/run/nodes.snapshot
+    ./snapshot.py /var/run/nodes.snapshot --community bielefeld
+    ./snapshot.py /var/run/nodes.snapshot --mac 02:aa:bb:cc:dd:ee
+
+License: CC0 1.0
+'''
+
+import os
+import sys
+import mmap
+import math
+import struct
+import datetime
+import collections
+
+
+MAGIC = b'FFSNAP\x00\x01'
+
+# magic, timestamp, node_count, nodes_offset, mac_count, index_offset,
+# community_count, communities_offset, strings_offset, strings_size
+HEADER = struct.Struct('<8sqIIIIIIII')
+
+# mac, flags, clients, uptime, latitude, longitude, firstseen, lastseen,
+# loadavg, memory_usage, rootfs_usage and the string offsets of name,
+# community, firmware, model, contact and autoupdater
+NODE = struct.Struct('<6sBxHIddqqdddIIIIII')
+
+# mac, record
+INDEX = struct.Struct('<6sI')
+
+# name, nodes, online nodes, clients of online nodes, online gateways
+COMMUNITY = struct.Struct('<IIIII')
+
+LENGTH = struct.Struct('<H')
+
+ONLINE = 1
+GATEWAY = 2
+VPN = 4
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+Node = collections.namedtuple('Node', ['mac', 'online', 'gateway', 'vpn', 'clients', 'uptime',
+    'latitude', 'longitude', 'firstseen', 'lastseen', 'loadavg', 'memory_usage', 'rootfs_usage',
+    'name', 'community', 'firmware', 'model', 'contact', 'autoupdater'])
+Node.__doc__ = r'''
+A node in a snapshot. ``latitude``/``longitude`` are ``None`` for nodes
+without a location, ``firstseen``/``lastseen`` naive UTC datetimes (or
+``None``), ``uptime`` in seconds.
+'''
+
+Totals = collections.namedtuple('Totals', ['nodes', 'online', 'clients', 'gateways'])
+
+
+def _seconds(timestamp):
+    return int((timestamp - EPOCH).total_seconds()) if timestamp else 0
+
+def _datetime(seconds):
+    return EPOCH + datetime.timedelta(seconds=seconds) if seconds else None
+
+def _mac(mac):
+    return bytes.fromhex(mac.replace(':', ''))
+
+def _mac_string(data):
+    return ':'.join('{:02x}'.format(b) for b in data)
+
+class StringTable:
+    r'''
+    The strings of a snapshot being written, each stored once.
+    '''
+    def __init__(self):
+        self.data = bytearray(LENGTH.pack(0))
+        self.offsets = { '': 0 }
+
+    def add(self, string):
+        string = str(string or '')
+        if string not in self.offsets:
+            # cut at a character boundary
+            encoded = string.encode('utf-8')[:0xffff].decode('utf-8', 'ignore').encode('utf-8')
+            self.offsets[string] = len(self.data)
+            self.data += LENGTH.pack(len(encoded)) + encoded
+        return self.offsets[string]
+
+def dumps(timestamp, nodes):
+    r'''
+    Return a snapshot of ``nodes`` (any MAC of a node => :class:`Node`, the
+    same object for all MACs of a node).
+    '''
+    unique = {}
+    for node in nodes.values():
+        unique[node.mac] = node
+    macs = sorted(unique)
+    records = { mac: i for i, mac in enumerate(macs) }
+
+    strings = StringTable()
+    communities = {}
+    data = bytearray()
+    for mac in macs:
+        node = unique[mac]
+        flags = (ONLINE if node.online else 0) | (GATEWAY if node.gateway else 0) | (VPN if node.vpn else 0)
+        latitude = math.nan if node.latitude is None else node.latitude
+        longitude = math.nan if node.longitude is None else node.longitude
+        data += NODE.pack(_mac(mac), flags, min(node.clients, 0xffff), min(max(int(node.uptime), 0), 0xffffffff), latitude, longitude,
+            _seconds(node.firstseen), _seconds(node.lastseen), node.loadavg, node.memory_usage, node.rootfs_usage,
+            strings.add(node.name), strings.add(node.community), strings.add(node.firmware),
+            strings.add(node.model), strings.add(node.contact), strings.add(node.autoupdater))
+
+        totals = communities.setdefault(node.community or '', [0, 0, 0, 0])
+        totals[0] += 1
+        if node.online:
+            totals[1] += 1
+            totals[2] += node.clients
+            if node.gateway:
+                totals[3] += 1
+
+    index = bytearray()
+    for mac in sorted(nodes):
+        index += INDEX.pack(_mac(mac), records[nodes[mac].mac])
+
+    for community in sorted(communities):
+        communities[community] = COMMUNITY.pack(strings.add(community), *communities[community])
+
+    nodes_offset = HEADER.size
+    index_offset = nodes_offset + len(data)
+    communities_offset = index_offset + len(index)
+    strings_offset = communities_offset + COMMUNITY.size * len(communities)
+
+    header = HEADER.pack(MAGIC, _seconds(timestamp), len(macs), nodes_offset, len(nodes), index_offset,
+        len(communities), communities_offset, strings_offset, len(strings.data))
+
+    return b''.join([header, data, index] + [communities[community] for community in sorted(communities)] + [strings.data])
+
+def write(path, timestamp, nodes):
+    r'''
+    Write a snapshot of ``nodes`` to ``path`` (see :func:`dumps`).
+
+    The file is replaced atomically, so readers that still have the old
+    snapshot mapped keep a consistent view.
+    '''
+    with open(path + '.tmp', 'wb') as file:
+        file.write(dumps(timestamp, nodes))
+    os.replace(path + '.tmp', path)
+
+def is_snapshot(path):
+    r'''
+    Return whether ``path`` is a snapshot (and not e.g. a JSON file).
+    '''
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+class Snapshot:
+    r'''
+    A snapshot opened for reading.
+
+    Nodes can be accessed by their position (in the order of their primary
+    MAC), looked up by any of their MACs with :meth:`find` and iterated over.
+    '''
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.buffer) < HEADER.size:
+            self.close()
+            raise ValueError("{} is truncated".format(path))
+
+        (magic, timestamp, self.node_count, self.nodes_offset, self.mac_count, self.index_offset,
+            self.community_count, self.communities_offset, self.strings_offset, strings_size) = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("{} is not a snapshot of map-backend.py".format(path))
+        if self.strings_offset + strings_size > len(self.buffer):
+            self.close()
+            raise ValueError("{} is truncated".format(path))
+
+        self.timestamp = _datetime(timestamp)
+        self.strings = {}
+
+    def close(self):
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.node_count
+
+    def __iter__(self):
+        for i in range(self.node_count):
+            yield self[i]
+
+    def string(self, offset):
+        # most strings (communities, firmwares, models) are shared by many nodes
+        if offset not in self.strings:
+            start = self.strings_offset + offset
+            length = LENGTH.unpack_from(self.buffer, start)[0]
+            self.strings[offset] = self.buffer[start + LENGTH.size:start + LENGTH.size + length].decode('utf-8')
+        return self.strings[offset]
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.node_count:
+            raise IndexError(i)
+
+        (mac, flags, clients, uptime, latitude, longitude, firstseen, lastseen, loadavg, memory_usage, rootfs_usage,
+            name, community, firmware, model, contact, autoupdater) = NODE.unpack_from(self.buffer, self.nodes_offset + i * NODE.size)
+
+        return Node(_mac_string(mac), bool(flags & ONLINE), bool(flags & GATEWAY), bool(flags & VPN),
+            clients, uptime, None if math.isnan(latitude) else latitude, None if math.isnan(longitude) else longitude,
+            _datetime(firstseen), _datetime(lastseen), loadavg, memory_usage, rootfs_usage,
+            self.string(name), self.string(community), self.string(firmware), self.string(model),
+            self.string(contact), self.string(autoupdater))
+
+    def find(self, mac):
+        r'''
+        Return the node with primary or interface MAC ``mac`` or ``None``.
+        '''
+        key = _mac(mac)
+        low, high = 0, self.mac_count
+        while low < high:
+            middle = (low + high) // 2
+            offset = self.index_offset + middle * INDEX.size
+            current = self.buffer[offset:offset + 6]
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return self[INDEX.unpack_from(self.buffer, offset)[1]]
+        return None
+
+    def communities(self):
+        r'''
+        Return a dictionary community => :class:`Totals`.
+        '''
+        communities = {}
+        for i in range(self.community_count):
+            name, *totals = COMMUNITY.unpack_from(self.buffer, self.communities_offset + i * COMMUNITY.size)
+            communities[self.string(name)] = Totals(*totals)
+        return communities
+
+    def totals(self, community = None):
+        r'''
+        Return the :class:`Totals` of ``community`` (of all nodes if
+        ``None``).
+        '''
+        totals = [0, 0, 0, 0]
+        for name, values in self.communities().items():
+            if community is None or community == name:
+                totals = [a + b for a, b in zip(totals, values)]
+        return Totals(*totals)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Query a snapshot written by map-backend.py')
+    parser.add_argument('snapshot', help=r'snapshot file (see --snapshot of map-backend.py)')
+    parser.add_argument('--community', help=r'only count the nodes of this community')
+    parser.add_argument('--mac', help=r'print the node with this (primary or interface) MAC')
+    args = parser.parse_args()
+
+    with Snapshot(args.snapshot) as snapshot:
+        if args.mac:
+            node = snapshot.find(args.mac)
+            if node is None:
+                print("Node {} not found".format(args.mac))
+                return 1
+            for field, value in node._asdict().items():
+                print("{}: {}".format(field, value))
+            return 0
+
+        totals = snapshot.totals(args.community)
+        print("timestamp: {}".format(snapshot.timestamp.isoformat() if snapshot.timestamp else '-'))
+        for field, value in totals._asdict().items():
+            print("{}: {}".format(field, value))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -107,6 +107,10 @@ if [ -n "$1" ]; then
   #change group/owner to webserver
   chown www-data:www-data "$src"
 
-  #move to final destination
-  mv "$src" "$dst"
+  #move to final destination (keep the old file if nothing changed)
+  if cmp -s "$src" "$dst"; then
+    rm "$src"
+  else
+    mv "$src" "$dst"
+  fi
 fi
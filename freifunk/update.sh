@@ -15,6 +15,8 @@ firmware="server"
 community="bielefeld"
 webserver="true" #start webserver, create map/status/status page
 gateway="false" #start OpenVPN, bind, tayga, radvd
+dns_master="" #primary server of the nodes.ffbi zone to send node names to (nsupdate), none if empty
+dns_key="/etc/bind/nodes.ffbi.key" #TSIG key the primary accepts updates of nodes.ffbi with (nsupdate -k)
 
 
 ##############
@@ -140,31 +142,13 @@ fi
 } | alfred -s 91 -u /var/run/alfred/alfred.sock
 
 
-#announce map information via alfred
-{
-	vpn="true"
-
-	echo -n "{"
-	[ -n "$name" ] && echo -n "\"name\" : \"$name\", "
-	[ -n "$firmware" ] && echo -n "\"firmware\" : \"$firmware\", "
-	[ -n "$community" ] && echo -n "\"community\" : \"$community\", "
-	[ -n "$vpn" ] && echo -n "\"vpn\" : $vpn, "
-	[ -n "$gateway" ] && echo -n "\"gateway\" : $gateway, "
-	echo -n "\"links\" : ["
-	printLink() { echo -n "{ \"smac\" : \"$(cat /sys/class/net/$3/address)\", \"dmac\" : \"$1\", \"qual\" : 100.0 }"; }
-	# do not remove the linebreak between quotes below - it is intentional
-	IFS="
-"
-	nd=0
-	for entry in $(awk -F '[][)( \t]+' '/^[a-f0-9]/{ print($1, $3, $4) }' /sys/kernel/debug/batman_adv/bat0/neighbors 2> /dev/null); do
-		[ $nd -eq 0 ] && nd=1 || echo -n ", "
-		IFS=" "
-		printLink $entry
-	done
-	echo -n '], '
-	echo -n "\"clientcount\" : 0"
-	echo -n '}'
-} | gzip -c - | alfred -s 64 -u /var/run/alfred/alfred.sock
+#announce map information via alfred (keeps running, pushes on changes and every 4 minutes)
+if ! start-stop-daemon --status --pidfile /var/run/alfred_announce.pid; then
+	echo "(I) Start alfred_announce."
+	start-stop-daemon --start --background --make-pidfile --pidfile /var/run/alfred_announce.pid \
+		--startas "$(pwd)/alfred_announce.py" -- --name "$name" --firmware "$firmware" --community "$community" \
+		--vpn true --gateway "$gateway" -u /var/run/alfred/alfred.sock --interval 60
+fi
 
 
 if [ "$gateway" = "true" ]; then
@@ -191,17 +175,34 @@ fi
 
 if [ "$webserver" = "true" ]; then
 
-	#collect all map pieces
-	alfred -r 64 -u /var/run/alfred/alfred.sock > /tmp/maps.txt
+	#node names for the nodes.ffbi zone (delegated from ffbi, so nodes cannot take over other names)
+	dns_args=""
+	if [ -n "$dns_master" ]; then
+		dns_args="--dns-zone /var/run/nodes.ffbi.zone --dns-origin nodes.ffbi --dns-changes /var/run/nodes.ffbi.nsupdate --dns-server $dns_master"
+	fi
 
-	#create map data
-	./map-backend.py -m /tmp/maps.txt -a ./aliases.json --meshviewer-org /var/www/meshviewer/data/meshviewer.json
+	#create map data and the list of services from the data collected by alfred (types 64 and 91)
+	./map-backend.py -u /var/run/alfred/alfred.sock -a ./aliases.json --meshviewer-org /var/www/meshviewer/data/meshviewer.json \
+		--search-index /var/www/meshviewer/data/search --services /var/www/meshviewer/data/services.json \
+		--snapshot /var/run/nodes.snapshot --manifest /var/www/manifest.json $dns_args
+
+	#send changed node names, signed with the TSIG key (kept for the next run if that fails)
+	if [ -s /var/run/nodes.ffbi.nsupdate ]; then
+		if [ -f "$dns_key" ]; then
+			nsupdate -k "$dns_key" /var/run/nodes.ffbi.nsupdate && rm /var/run/nodes.ffbi.nsupdate
+		else
+			echo "(E) TSIG key $dns_key not found, node names not sent."
+		fi
+	fi
 
 	#update FF-Internal status page
 	./status_page_create.sh '/var/www/index.html'
 
 	#update nodes/clients/gateways counter
-	./counter_update.py '/var/var/www/meshviewer/data/meshviewer.json' '/var/www/counter.svg'
+	./counter_update.py '/var/run/nodes.snapshot' '/var/www/counter.svg'
+
+	#record the files written above for ETags
+	./manifest.py '/var/www/manifest.json' '/var/www/index.html' '/var/www/counter.svg'
 
 	if ! is_running "lighttpd"; then
 		echo "(I) Start lighttpd."
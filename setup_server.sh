@@ -96,6 +96,13 @@ apt update
 {
 	echo "(I) Create /opt/freifunk/"
 	apt install --assume-yes python3 python3-jsonschema
+
+	#map-backend.py (e.g. its query server) needs Python 3.7
+	if ! python3 -c 'import sys; sys.exit(sys.version_info < (3, 7))'; then
+		echo "(E) Python 3.7 or newer is required."
+		exit 1
+	fi
+
 	cp -rf freifunk /opt/
 
 	sed -i "s/ip_addr=\".*\"/ip_addr=\"$ip_addr\"/g" /opt/freifunk/update.sh